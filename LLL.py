@@ -1,10 +1,10 @@
-<<<<<<< HEAD
 # QMS System - Thi Qar Oil Company (Quality & Performance Division)
 # GUI if Qt is available (PyQt6 preferred, fallback to PyQt5). Otherwise, run in CLI/headless mode.
 # SQLite backend + centered company logo + optional background music (GUI only)
 # Designed by Chief Engineer Tareq Majeed Al-Karimi
 
-import sys, os, csv, shutil, sqlite3
+import sys, os, csv, shutil, sqlite3, itertools, tempfile
+from contextlib import contextmanager
 
 # -------- Optional Excel support --------
 try:
@@ -14,1199 +14,12 @@ except Exception:
     pd = None
     HAS_PANDAS = False
 
-# ================================================================
-# Qt Compatibility Layer (may be unavailable in this environment)
-# ================================================================
-QT_API = 0  # 0=headless, 6=PyQt6, 5=PyQt5
-HEADLESS = True
-
-try:  # Prefer PyQt6
-    from PyQt6.QtWidgets import (
-        QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-        QListWidget, QStackedWidget, QFileDialog, QMessageBox, QTableView, QToolBar,
-        QStatusBar, QSplitter, QLineEdit, QTextEdit, QFormLayout, QDateEdit, QComboBox,
-        QCheckBox, QInputDialog, QAbstractItemView
-    )
-    from PyQt6.QtCore import Qt, QDate, QUrl
-    try:
-        from PyQt6.QtGui import QAction  # PyQt6 puts QAction in QtGui
-    except Exception:
-        from PyQt6.QtWidgets import QAction
-    from PyQt6.QtGui import QIcon, QPixmap
-    from PyQt6.QtSql import QSqlDatabase, QSqlTableModel, QSqlQuery
-    try:
-        from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
-    except Exception:
-        QMediaPlayer = QAudioOutput = None
-    QT_API = 6
-    HEADLESS = False
-    ALIGN_CENTER = Qt.AlignmentFlag.AlignCenter
-    SMOOTH = Qt.TransformationMode.SmoothTransformation
-    HORIZONTAL = Qt.Orientation.Horizontal
-    SELECT_ROWS = QTableView.SelectionBehavior.SelectRows
-    EDIT_DBL = QAbstractItemView.EditTrigger.DoubleClicked | QAbstractItemView.EditTrigger.SelectedClicked | QAbstractItemView.EditTrigger.EditKeyPressed
-    EDIT_NONE = QAbstractItemView.EditTrigger.NoEditTriggers
-except Exception:
-    try:  # Fallback to PyQt5
-        from PyQt5.QtWidgets import (
-            QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
-            QListWidget, QStackedWidget, QFileDialog, QMessageBox, QTableView, QToolBar,
-            QStatusBar, QSplitter, QLineEdit, QTextEdit, QFormLayout, QDateEdit, QComboBox,
-            QCheckBox, QAction, QInputDialog, QAbstractItemView
-        )
-        from PyQt5.QtCore import Qt, QDate, QUrl
-        from PyQt5.QtGui import QIcon, QPixmap
-        from PyQt5.QtSql import QSqlDatabase, QSqlTableModel, QSqlQuery
-        try:
-            from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-        except Exception:
-            QMediaPlayer = None
-            QMediaContent = None
-        QT_API = 5
-        HEADLESS = False
-        ALIGN_CENTER = Qt.AlignCenter
-        SMOOTH = Qt.SmoothTransformation
-        HORIZONTAL = Qt.Horizontal
-        SELECT_ROWS = QTableView.SelectRows
-        EDIT_DBL = (QAbstractItemView.DoubleClicked | QAbstractItemView.SelectedClicked | QAbstractItemView.EditKeyPressed)
-        EDIT_NONE = QAbstractItemView.NoEditTriggers
-    except Exception:
-        QT_API = 0
-        HEADLESS = True
-
-APP_TITLE = "QMS – Quality & Performance Division | Thi Qar Oil Company"
-DB_NAME = "qms.sqlite"
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-LOGO_PATHS = [
-    "/mnt/data/logo.png",
-    os.path.join(BASE_DIR, "logo.png"),
-    os.path.join(BASE_DIR, "sold.png"),
-    os.path.join(BASE_DIR, "company_logo.png"),
-    "logo.png",
-    "sold.png",
-    "company_logo.png",
-    os.path.join(BASE_DIR, "resources", "sold.png"),
-]
-AUDIO_PATHS = [
-    "/mnt/data/Audio.mp3",
-    os.path.join(BASE_DIR, "Audio.mp3"),
-    os.path.join(BASE_DIR, "audio.mp3"),
-    "Audio.mp3",
-    "audio.mp3",
-    os.path.join(BASE_DIR, "resources", "audio.mp3"),
-]
-FOOTER_TEXT = "Designed by Chief Engineer Tareq Majeed Al-Karimi"
-
-# ================================================================
-# Per-section write passwords (no login screen)  
-# Empty string => section remains read-only (cannot unlock)
-# ================================================================
-SECTION_PASSWORDS = {
-    # ضع كلمة سر للأقسام التي تريد السماح بالتحرير فيها بعد إدخالها.
-    # أقسام بلا كلمة سر ستبقى قراءة فقط.
-    "policies":        "P0l!cy@2025",
-    "objectives":      "0bj@2025",
-    "documents":       "Doc@2025",
-    "audit_plan":      "Plan@2025",
-    "audits":          "Aud1t@2025",
-    "nonconformities": "NC@2025",
-    "capa":            "CAPA@2025",
-    "knowledge_base":  "KB@2025",
-    "reports":         "Rep@2025",
-    "notifications":   "Noti@2025",
-    "signatures":      "Sign@2025",
-}
-
-def check_section_password(section_key: str, parent=None) -> bool:
-    """Ask for the section password; True if correct. If not configured -> False."""
-    expected = SECTION_PASSWORDS.get(section_key, "")
-    if not expected:
-        return False
-    # PyQt6/5 compatibility for password echo mode
-    try:
-        text, ok = QInputDialog.getText(parent, "Unlock", f"Enter password for [{section_key}]",
-                                        QLineEdit.EchoMode.Password)
-    except Exception:
-        text, ok = QInputDialog.getText(parent, "Unlock", f"Enter password for [{section_key}]",
-                                        QLineEdit.Password)
-    if not ok:
-        return False
-    return text == expected
-
-# ================================================================
-# Schema (used by both GUI/Qt and headless/CLI)
-# ================================================================
-SCHEMA_SQL = [
-    """
-    CREATE TABLE IF NOT EXISTS policies (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        body TEXT,
-        version TEXT,
-        approved_by TEXT,
-        approved_on TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS objectives (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT NOT NULL,
-        metric TEXT,
-        target TEXT,
-        period TEXT,
-        owner TEXT,
-        progress INTEGER DEFAULT 0
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS documents (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        code TEXT,
-        version TEXT,
-        owner TEXT,
-        status TEXT,
-        review_date TEXT,
-        file_path TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS audit_plan (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        area TEXT NOT NULL,
-        planned_date TEXT,
-        auditor TEXT,
-        scope TEXT,
-        status TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS audits (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        area TEXT NOT NULL,
-        audit_date TEXT,
-        auditor TEXT,
-        findings TEXT,
-        status TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS nonconformities (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT,
-        description TEXT,
-        root_cause TEXT,
-        owner TEXT,
-        due_date TEXT,
-        status TEXT,
-        related_audit INTEGER
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS capa (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        nc_id INTEGER,
-        action TEXT,
-        owner TEXT,
-        due_date TEXT,
-        status TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS knowledge_base (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT,
-        content TEXT,
-        tags TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS reports (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT,
-        period TEXT,
-        notes TEXT,
-        created_on TEXT
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS notifications (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        title TEXT,
-        due_date TEXT,
-        assigned_to TEXT,
-        seen INTEGER DEFAULT 0
-    );
-    """,
-    """
-    CREATE TABLE IF NOT EXISTS signatures (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        person TEXT,
-        role TEXT,
-        image_path TEXT,
-        signed_on TEXT
-    );
-    """
-]
-
-# ================================================================
-# DB Helpers (Qt or sqlite3)
-# ================================================================
-
-def ensure_schema_sqlite3():
-    con = sqlite3.connect(DB_NAME)
-    try:
-        cur = con.cursor()
-        for sql in SCHEMA_SQL:
-            cur.executescript(sql)
-        con.commit()
-    finally:
-        con.close()
-
-if not HEADLESS:
-    def get_db_connection_qt():
-        db = QSqlDatabase.addDatabase("QSQLITE")
-        db.setDatabaseName(DB_NAME)
-        if not db.open():
-            raise RuntimeError("Failed to open database")
-        return db
-
-    def ensure_schema_qt():
-        for sql in SCHEMA_SQL:
-            QSqlQuery().exec(sql)
-
-# ================================================================
-# GUI Implementation (only if Qt available)
-# ================================================================
-if not HEADLESS:
-    class TablePage(QWidget):
-        def __init__(self, table_name: str, headers: dict[str, str], section_key: str | None = None):
-            super().__init__()
-            self.table_name = table_name
-            self.headers = headers
-            self.section_key = section_key or table_name
-            self.unlocked = False
-
-            layout = QVBoxLayout(self)
-            layout.setContentsMargins(24, 16, 24, 16)
-            layout.setSpacing(12)
-
-            self.model = QSqlTableModel(self)
-            self.model.setTable(table_name)
-            self.model.select()
-
-            for col in range(self.model.columnCount()):
-                field = self.model.record().fieldName(col)
-                if field in headers:
-                    self.model.setHeaderData(col, HORIZONTAL, headers[field])
-
-            self.view = QTableView()
-            self.view.setModel(self.model)
-            # Better readability: row/column sizing
-            try:
-                vh = self.view.verticalHeader()
-                hh = self.view.horizontalHeader()
-                vh.setDefaultSectionSize(28)
-                hh.setStretchLastSection(True)
-            except Exception:
-                pass
-            self.view.setSelectionBehavior(SELECT_ROWS)
-            self.view.setAlternatingRowColors(True)
-            self.view.resizeColumnsToContents()
-            self.view.setStyleSheet(
-                "QTableView{selection-background-color:#cbdfff;}"
-                "QHeaderView::section{background:#f2f4f8;border:1px solid #e5e9f0;}"
-            )
-            # read-only until unlocked
-            try:
-                self.view.setEditTriggers(EDIT_NONE)
-            except Exception:
-                pass
-
-            btn_bar = QHBoxLayout()
-            self.btn_add = QPushButton("Add Row")
-            self.btn_del = QPushButton("Delete Selected")
-            self.btn_save = QPushButton("Save")
-            self.btn_export = QPushButton("Export CSV…")
-            self.btn_import = QPushButton("Import CSV…")
-            self.btn_import_excel = QPushButton("Import Excel…")
-            self.btn_unlock = QPushButton("Unlock")
-
-            for b in (self.btn_add, self.btn_del, self.btn_save, self.btn_export, self.btn_import, self.btn_import_excel, self.btn_unlock):
-                btn_bar.addWidget(b)
-
-            # Documents extras
-            self.btn_attach = None
-            self.btn_openfile = None
-            if table_name == "documents":
-                self.btn_attach = QPushButton("Attach File…")
-                self.btn_openfile = QPushButton("Open File")
-                btn_bar.addWidget(self.btn_attach)
-                btn_bar.addWidget(self.btn_openfile)
-
-            btn_bar.addStretch(1)
-
-            layout.addWidget(self.view)
-            layout.addLayout(btn_bar)
-
-            # default locked controls
-            def set_write_enabled(on: bool):
-                self.btn_add.setEnabled(on)
-                self.btn_del.setEnabled(on)
-                self.btn_save.setEnabled(on)
-                self.btn_import.setEnabled(on)
-                self.btn_import_excel.setEnabled(on)
-                if self.btn_attach:
-                    self.btn_attach.setEnabled(on)
-                # export/open are read-only actions -> keep enabled
-                self.btn_export.setEnabled(True)
-                if self.btn_openfile:
-                    self.btn_openfile.setEnabled(True)
-
-            self._set_write_enabled = set_write_enabled
-            set_write_enabled(False)
-
-            # connections
-            self.btn_add.clicked.connect(self.add_row)
-            self.btn_del.clicked.connect(self.delete_selected)
-            self.btn_save.clicked.connect(self.save)
-            self.btn_export.clicked.connect(self.export_csv)
-            self.btn_import.clicked.connect(self.import_csv)
-            self.btn_import_excel.clicked.connect(self.import_excel)
-            self.btn_unlock.clicked.connect(self.try_unlock)
-            if self.btn_attach:
-                self.btn_attach.clicked.connect(self.attach_file)
-            if self.btn_openfile:
-                self.btn_openfile.clicked.connect(self.open_file)
-
-        def try_unlock(self):
-            expected = SECTION_PASSWORDS.get(self.section_key, "")
-            if not expected:
-                QMessageBox.information(self, "Read-only", "This section is read-only (no password configured).")
-                return
-            if self.unlocked:
-                QMessageBox.information(self, "Unlocked", "Already unlocked.")
-                return
-            if check_section_password(self.section_key, self):
-                self.unlocked = True
-                self._set_write_enabled(True)
-                try:
-                    self.view.setEditTriggers(EDIT_DBL)
-                except Exception:
-                    pass
-                QMessageBox.information(self, "Unlocked", "Editing enabled for this section.")
-            else:
-                QMessageBox.warning(self, "Wrong password", "Password is incorrect.")
-
-        def _require_unlocked(self):
-            if not self.unlocked:
-                QMessageBox.warning(self, "Locked", "Unlock this section first.")
-                return False
-            return True
-
-        def add_row(self):
-            if not self._require_unlocked():
-                return
-            self.model.insertRow(self.model.rowCount())
-            self.view.scrollToBottom()
-
-        def delete_selected(self):
-            if not self._require_unlocked():
-                return
-            indexes = self.view.selectionModel().selectedRows()
-            if not indexes:
-                return
-            for idx in sorted(indexes, key=lambda i: i.row(), reverse=True):
-                self.model.removeRow(idx.row())
-
-        def save(self):
-            if not self._require_unlocked():
-                return
-            if not self.model.submitAll():
-                QMessageBox.critical(self, "Save Error", self.model.lastError().text())
-            else:
-                self.model.select()
-                QMessageBox.information(self, "Saved", "Changes saved successfully.")
-
-        def export_csv(self):
-            path, _ = QFileDialog.getSaveFileName(self, "Export CSV", f"{self.table_name}.csv", "CSV Files (*.csv)")
-            if not path:
-                return
-            with open(path, "w", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                headers = [self.model.headerData(c, HORIZONTAL) for c in range(self.model.columnCount())]
-                writer.writerow(headers)
-                for r in range(self.model.rowCount()):
-                    row = []
-                    for c in range(self.model.columnCount()):
-                        idx = self.model.index(r, c)
-                        row.append(self.model.data(idx))
-                    writer.writerow(row)
-            QMessageBox.information(self, "Export", f"Exported to {path}")
-
-        def import_csv(self):
-            if not self._require_unlocked():
-                return
-            path, _ = QFileDialog.getOpenFileName(self, "Import CSV", "", "CSV Files (*.csv)")
-            if not path:
-                return
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            cols = [self.model.record().fieldName(c) for c in range(self.model.columnCount())]
-            with open(path, newline='', encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                if not rows:
-                    QMessageBox.information(self, "Import", "CSV is empty.")
-                    con.close(); return
-                placeholders = ",".join(["?"] * len(cols))
-                sql = f"INSERT INTO {self.table_name}({','.join(cols)}) VALUES ({placeholders})"
-                imported = 0
-                for r in rows:
-                    vals = [r.get(c, None) for c in cols]
-                    try:
-                        cur.execute(sql, vals)
-                        imported += 1
-                    except Exception:
-                        pass
-                con.commit(); con.close()
-            self.model.select()
-            QMessageBox.information(self, "Import", f"Imported {imported} rows from {os.path.basename(path)}")
-
-        def import_excel(self):
-            if not self._require_unlocked():
-                return
-            path, _ = QFileDialog.getOpenFileName(self, "Import Excel", "", "Excel Files (*.xlsx *.xls)")
-            if not path:
-                return
-            if not HAS_PANDAS:
-                QMessageBox.critical(
-                    self,
-                    "Excel Support Missing",
-                    "Excel import requires pandas (and openpyxl for .xlsx).\n\n"
-                    "Install with: pip install pandas openpyxl"
-                )
-                return
-            try:
-                df = pd.read_excel(path, dtype=str)
-            except Exception as e:
-                QMessageBox.critical(self, "Read Excel Error", str(e))
-                return
-
-            # Map columns by name (case-insensitive)
-            df_cols_norm = {c.lower().strip(): c for c in df.columns}
-            table_cols = [self.model.record().fieldName(c) for c in range(self.model.columnCount())]
-            mapped_cols = []
-            for c in table_cols:
-                key = c.lower().strip()
-                src = df_cols_norm.get(key)
-                mapped_cols.append(src)
-
-            rows = []
-            for _, rec in df.iterrows():
-                vals = [rec[src] if (src in df.columns) else None for src in mapped_cols]
-                rows.append(vals)
-
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            placeholders = ",".join(["?"] * len(table_cols))
-            sql = f"INSERT INTO {self.table_name}({','.join(table_cols)}) VALUES ({placeholders})"
-            imported = 0
-            for vals in rows:
-                try:
-                    norm_vals = []
-                    for v in vals:
-                        if HAS_PANDAS and isinstance(v, float) and pd.isna(v):
-                            norm_vals.append(None)
-                        else:
-                            norm_vals.append(v)
-                    cur.execute(sql, norm_vals)
-                    imported += 1
-                except Exception:
-                    pass
-            con.commit()
-            con.close()
-
-            self.model.select()
-            QMessageBox.information(self, "Import", f"Imported {imported} rows from {os.path.basename(path)}")
-
-        # ---- Documents-specific helpers ----
-        def _selected_row_id(self):
-            indexes = self.view.selectionModel().selectedRows()
-            if not indexes:
-                return None
-            row = indexes[0].row()
-            idx = self.model.index(row, 0)
-            return self.model.data(idx), row
-
-        def attach_file(self):
-            if not self._require_unlocked():
-                return
-            if self.table_name != "documents":
-                return
-            sel = self._selected_row_id()
-            if sel is None:
-                QMessageBox.warning(self, "No selection", "Select a document row first.")
-                return
-            _id, row = sel
-            src, _ = QFileDialog.getOpenFileName(self, "Attach File", "", "All Files (*.*)")
-            if not src:
-                return
-            attachments_dir = os.path.join(BASE_DIR, "attachments")
-            try:
-                os.makedirs(attachments_dir, exist_ok=True)
-                dst = os.path.join(attachments_dir, os.path.basename(src))
-                shutil.copyfile(src, dst)
-                # write file_path
-                col = None
-                for c in range(self.model.columnCount()):
-                    if self.model.record().fieldName(c) == "file_path":
-                        col = c; break
-                if col is not None:
-                    self.model.setData(self.model.index(row, col), dst)
-                    self.model.submitAll(); self.model.select()
-                    QMessageBox.information(self, "Attached", f"File attached to record #{_id}.")
-            except Exception as e:
-                QMessageBox.critical(self, "Attach Error", str(e))
-
-        def open_file(self):
-            if self.table_name != "documents":
-                return
-            sel = self._selected_row_id()
-            if sel is None:
-                QMessageBox.warning(self, "No selection", "Select a document row first.")
-                return
-            _id, row = sel
-            col = None
-            for c in range(self.model.columnCount()):
-                if self.model.record().fieldName(c) == "file_path":
-                    col = c; break
-            if col is None:
-                QMessageBox.warning(self, "No file_path column", "This table has no file_path column configured.")
-                return
-            path = self.model.data(self.model.index(row, col))
-            if not path or not os.path.exists(path):
-                QMessageBox.warning(self, "Missing File", "No file is attached or file not found.")
-                return
-            try:
-                if sys.platform.startswith('win'):
-                    os.startfile(path)  # type: ignore
-                elif sys.platform == 'darwin':
-                    os.system(f'open "{path}"')
-                else:
-                    os.system(f'xdg-open "{path}"')
-            except Exception as e:
-                QMessageBox.critical(self, "Open Error", str(e))
-
-    class DashboardPage(QWidget):
-        def __init__(self):
-            super().__init__()
-            lay = QVBoxLayout(self)
-            lay.setContentsMargins(24, 16, 24, 16)
-            lay.setSpacing(12)
-
-            # Centered company logo
-            logo_label = QLabel()
-            logo_label.setAlignment(ALIGN_CENTER)
-
-            def resolve_existing(paths):
-                for p in paths:
-                    try:
-                        if p and os.path.exists(p):
-                            return os.path.abspath(p)
-                    except Exception:
-                        pass
-                return None
-
-            logo_file = resolve_existing(LOGO_PATHS)
-            if logo_file:
-                pix = QPixmap(logo_file)
-                if not pix.isNull():
-                    logo_label.setPixmap(pix.scaledToHeight(96, SMOOTH))
-                else:
-                    logo_label.setText("[Logo not readable]")
-                    logo_label.setStyleSheet("color:#777; border:1px dashed #aaa; padding:8px;")
-            else:
-                logo_label.setText("[Thi Qar Oil Company Logo]")
-                logo_label.setStyleSheet("color:#777; border:1px dashed #aaa; padding:8px;")
-            lay.addWidget(logo_label)
-
-            title = QLabel("Quality Management System – Quality & Performance Division")
-            title.setAlignment(ALIGN_CENTER)
-            title.setStyleSheet("font-size:20px; font-weight:600; margin-top:6px;")
-            subtitle = QLabel("Internal automation for policies, audits, NCs, CAPA, objectives and reports.")
-            subtitle.setAlignment(ALIGN_CENTER)
-            subtitle.setStyleSheet("color:#444;")
-
-            lay.addWidget(title)
-            lay.addWidget(subtitle)
-
-            tips = QLabel(
-                "• Use the left menu to open modules.\n"
-                "• Right-click inside tables for copy/paste.\n"
-                "• Use Export to create CSV files; attach to reports.\n"
-                "• Keep data synchronized: save after edits.\n"
-                "• In Documents: use Attach File to copy/link PDFs, Excel, Word, images, etc."
-            )
-            tips.setStyleSheet("background:#f5f7fb; border:1px solid #e2e6ef; padding:10px; border-radius:8px; margin-top:10px;")
-            lay.addWidget(tips)
-            lay.addStretch(1)
-
-    class SignaturePage(QWidget):
-        """Simple E-Signature page (stores name/role and optional image path)."""
-        def __init__(self):
-            super().__init__()
-            layout = QVBoxLayout(self)
-            layout.setContentsMargins(24, 16, 24, 16)
-            layout.setSpacing(12)
-            title = QLabel("E-Signature")
-            title.setAlignment(ALIGN_CENTER)
-            title.setStyleSheet("font-size:18px; font-weight:600;")
-            layout.addWidget(title)
-
-            form = QFormLayout()
-            try:
-                form.setSpacing(12)
-            except Exception:
-                pass
-            self.person = QLineEdit()
-            self.role = QLineEdit()
-            self.image_path = QLineEdit()
-            self.btn_browse = QPushButton("Browse Image…")
-            self.btn_browse.clicked.connect(self.browse)
-            form.addRow("Person", self.person)
-            form.addRow("Role", self.role)
-            row = QHBoxLayout()
-            row.addWidget(self.image_path)
-            row.addWidget(self.btn_browse)
-            form.addRow("Image", row)
-            layout.addLayout(form)
-
-            self.btn_save = QPushButton("Save Signature")
-            self.btn_save.clicked.connect(self.save)
-            layout.addWidget(self.btn_save)
-
-            # per-section unlock for signatures
-            self.unlocked = False
-            self.btn_unlock = QPushButton("Unlock")
-            layout.addWidget(self.btn_unlock)
-            self.btn_save.setEnabled(False)
-
-            def on_unlock():
-                expected = SECTION_PASSWORDS.get("signatures", "")
-                if not expected:
-                    QMessageBox.information(self, "Read-only", "This section is read-only (no password configured).")
-                    return
-                if self.unlocked:
-                    QMessageBox.information(self, "Unlocked", "Already unlocked.")
-                    return
-                if check_section_password("signatures", self):
-                    self.unlocked = True
-                    self.btn_save.setEnabled(True)
-                    QMessageBox.information(self, "Unlocked", "Editing enabled for signatures.")
-                else:
-                    QMessageBox.warning(self, "Wrong password", "Password is incorrect.")
-
-            self.btn_unlock.clicked.connect(on_unlock)
-            layout.addStretch(1)
-
-        def browse(self):
-            path, _ = QFileDialog.getOpenFileName(self, "Select Signature", "", "Images (*.png *.jpg *.jpeg)")
-            if path:
-                self.image_path.setText(path)
-
-        def save(self):
-            if not self.unlocked:
-                QMessageBox.warning(self, "Locked", "Unlock this section first.")
-                return
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            cur.execute(
-                "INSERT INTO signatures(person, role, image_path, signed_on) VALUES (?,?,?,date('now'))",
-                (self.person.text(), self.role.text(), self.image_path.text())
-            )
-            con.commit()
-            con.close()
-            QMessageBox.information(self, "Saved", "Signature saved.")
-            self.person.clear(); self.role.clear(); self.image_path.clear()
-
-    class NotificationsPage(QWidget):
-        """Notifications view using QSqlTableModel for consistency."""
-        def __init__(self):
-            super().__init__()
-            layout = QVBoxLayout(self)
-            layout.setContentsMargins(24, 16, 24, 16)
-            layout.setSpacing(12)
-            title = QLabel("Notifications")
-            title.setAlignment(ALIGN_CENTER)
-            title.setStyleSheet("font-size:18px; font-weight:600;")
-            layout.addWidget(title)
-
-            self.model = QSqlTableModel(self)
-            self.model.setTable("notifications")
-            self.model.select()
-
-            self.view = QTableView()
-            self.view.setModel(self.model)
-            self.view.setSelectionBehavior(SELECT_ROWS)
-            self.view.resizeColumnsToContents()
-            layout.addWidget(self.view)
-
-            bar = QHBoxLayout()
-            self.btn_add = QPushButton("Quick Add")
-            self.btn_seen = QPushButton("Mark Seen")
-            self.btn_refresh = QPushButton("Refresh")
-            for b in (self.btn_add, self.btn_seen, self.btn_refresh):
-                bar.addWidget(b)
-            bar.addStretch(1)
-            layout.addLayout(bar)
-
-            self.btn_add.clicked.connect(self.quick_add)
-            self.btn_seen.clicked.connect(self.mark_seen)
-            self.btn_refresh.clicked.connect(self.model.select)
-
-        def quick_add(self):
-            q = QSqlQuery()
-            q.exec("INSERT INTO notifications(title, due_date, assigned_to, seen) VALUES ('Review documents', date('now','+3 day'), 'Quality Team', 0)")
-            self.model.select()
-
-        def mark_seen(self):
-            indexes = self.view.selectionModel().selectedRows()
-            if not indexes:
-                return
-            q = QSqlQuery()
-            for idx in indexes:
-                rowid = self.model.data(self.model.index(idx.row(), 0))
-                q.exec(f"UPDATE notifications SET seen=1 WHERE id={rowid}")
-            self.model.select()
-
-    class AudioHelper:
-        def __init__(self, parent=None):
-            self.available = QMediaPlayer is not None
-            self.player = None
-            self.output = None
-            self.api = QT_API
-            if not self.available:
-                return
-            if QT_API == 6:
-                self.player = QMediaPlayer(parent)
-                self.output = QAudioOutput(parent) if 'QAudioOutput' in globals() and QAudioOutput else None
-                if self.output:
-                    try:
-                        self.player.setAudioOutput(self.output)
-                        self.output.setVolume(0.25)
-                    except Exception:
-                        pass
-                self.player.mediaStatusChanged.connect(self._on_status)
-            else:
-                self.player = QMediaPlayer(parent)
-                try:
-                    self.player.setVolume(25)
-                except Exception:
-                    pass
-                self.player.mediaStatusChanged.connect(self._on_status)
-
-        def _on_status(self, status):
-            try:
-                if self.api == 6:
-                    from PyQt6.QtMultimedia import QMediaPlayer as _P6
-                    if status == _P6.MediaStatus.EndOfMedia:
-                        self.player.setPosition(0)
-                        self.player.play()
-                else:
-                    if int(status) == 7:  # EndOfMedia for PyQt5
-                        self.player.setPosition(0)
-                        self.player.play()
-            except Exception:
-                pass
-
-        def start(self, paths):
-            if not self.available:
-                return False
-            path = next((p for p in paths if os.path.exists(p)), None)
-            if not path:
-                return False
-            url = QUrl.fromLocalFile(os.path.abspath(path))
-            try:
-                if QT_API == 6:
-                    self.player.setSource(url)
-                else:
-                    from PyQt5.QtMultimedia import QMediaContent
-                    self.player.setMedia(QMediaContent(url))
-            except Exception:
-                return False
-            try:
-                if QT_API == 6 and self.output:
-                    self.output.setVolume(0.25)
-                else:
-                    self.player.setVolume(25)
-            except Exception:
-                pass
-            self.player.play()
-            return True
-
-        def toggle_mute(self):
-            if not self.available or not self.player:
-                return False
-            try:
-                if QT_API == 6 and self.output:
-                    self.output.setVolume(0 if self.output.volume() > 0 else 0.25)
-                else:
-                    self.player.setMuted(not self.player.isMuted())
-            except Exception:
-                pass
-            return True
-
-    class MainWindow(QMainWindow):
-        def __init__(self):
-            super().__init__()
-            self.setWindowTitle(APP_TITLE)
-            self.resize(1200, 720)
-
-            tb = QToolBar("Main")
-            self.addToolBar(tb)
-
-            act_backup = QAction("Backup DB", self)
-            act_backup.triggered.connect(self.backup_db)
-            tb.addAction(act_backup)
-
-            act_open = QAction("Open DB Folder", self)
-            act_open.triggered.connect(self.open_folder)
-            tb.addAction(act_open)
-
-            self.audio = AudioHelper(self)
-            self.audio.start(AUDIO_PATHS)
-            act_mute = QAction("Music On/Off", self)
-            act_mute.triggered.connect(self.audio.toggle_mute)
-            tb.addAction(act_mute)
-
-            self.status = QStatusBar()
-            self.setStatusBar(self.status)
-
-            splitter = QSplitter()
-            splitter.setChildrenCollapsible(False)
-            self.menu = QListWidget()
-            self.menu.addItems([
-                "Dashboard",
-                "Quality Policy",
-                "Objectives",
-                "Document Control",
-                "Audit Plan",
-                "Audits",
-                "Non-Conformance",
-                "CAPA",
-                "Knowledge Base",
-                "Reports",
-                "Performance Evaluation (KPI)",
-                "E-Signature",
-                "Notifications"
-            ])
-            self.menu.setMinimumWidth(260)
-            self.menu.setMaximumWidth(320)
-
-            self.stack = QStackedWidget()
-            splitter.addWidget(self.menu)
-            splitter.addWidget(self.stack)
-            splitter.setStretchFactor(1, 1)
-            self.setCentralWidget(splitter)
-
-            # Pages
-            self.pages = []
-            self.add_page(DashboardPage())
-            self.add_page(TablePage("policies", {
-                "id": "ID", "title": "Title", "body": "Body", "version": "Version",
-                "approved_by": "Approved By", "approved_on": "Approved On"
-            }, section_key="policies"))
-            self.add_page(TablePage("objectives", {
-                "id": "ID", "title": "Title", "metric": "Metric", "target": "Target",
-                "period": "Period", "owner": "Owner", "progress": "Progress %"
-            }, section_key="objectives"))
-            self.add_page(TablePage("documents", {
-                "id": "ID", "name": "Name", "code": "Code", "version": "Version",
-                "owner": "Owner", "status": "Status", "review_date": "Review Date",
-                "file_path": "File Path"
-            }, section_key="documents"))
-            self.add_page(TablePage("audit_plan", {
-                "id": "ID", "area": "Area", "planned_date": "Planned Date",
-                "auditor": "Auditor", "scope": "Scope", "status": "Status"
-            }, section_key="audit_plan"))
-            self.add_page(TablePage("audits", {
-                "id": "ID", "area": "Area", "audit_date": "Audit Date", "auditor": "Auditor",
-                "findings": "Findings", "status": "Status"
-            }, section_key="audits"))
-            self.add_page(TablePage("nonconformities", {
-                "id": "ID", "date": "Date", "description": "Description",
-                "root_cause": "Root Cause", "owner": "Owner", "due_date": "Due Date",
-                "status": "Status", "related_audit": "Related Audit"
-            }, section_key="nonconformities"))
-            self.add_page(TablePage("capa", {
-                "id": "ID", "nc_id": "NC ID", "action": "Action",
-                "owner": "Owner", "due_date": "Due Date", "status": "Status"
-            }, section_key="capa"))
-            self.add_page(TablePage("knowledge_base", {
-                "id": "ID", "title": "Title", "content": "Content", "tags": "Tags"
-            }, section_key="knowledge_base"))
-            self.add_page(TablePage("reports", {
-                "id": "ID", "title": "Title", "period": "Period", "notes": "Notes",
-                "created_on": "Created On"
-            }, section_key="reports"))
-            self.add_page(TablePage("objectives", {
-                "id": "ID", "title": "Title", "metric": "Metric", "target": "Target",
-                "period": "Period", "owner": "Owner", "progress": "Progress %"
-            }, section_key="objectives"))
-            self.add_page(SignaturePage())
-            self.add_page(NotificationsPage())
-
-            self.menu.currentRowChanged.connect(self.stack.setCurrentIndex)
-            self.menu.setCurrentRow(0)
-
-            footer = QLabel(FOOTER_TEXT)
-            footer.setAlignment(ALIGN_CENTER)
-            footer.setStyleSheet("color:#666; padding:6px; border-top:1px solid #e5e5e5;")
-            self.status.addPermanentWidget(footer, 1)
-
-        def add_page(self, widget: QWidget):
-            self.pages.append(widget)
-            self.stack.addWidget(widget)
-
-        def backup_db(self):
-            path, _ = QFileDialog.getSaveFileName(self, "Backup SQLite", "qms_backup.sqlite", "SQLite DB (*.sqlite)")
-            if not path:
-                return
-            try:
-                shutil.copyfile(DB_NAME, path)
-                QMessageBox.information(self, "Backup", f"Database copied to {path}")
-            except Exception as e:
-                QMessageBox.critical(self, "Backup Error", str(e))
-
-        def open_folder(self):
-            folder = os.path.abspath(os.path.dirname(DB_NAME) or ".")
-            QMessageBox.information(self, "DB Folder", folder)
-
-# ================================================================
-# Self-tests & CLI tools (work in both modes)
-# ================================================================
-
-def selftest_basic() -> int:
-    """Test: create/open DB and ensure all tables exist."""
-    try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        names = {r[0] for r in cur.fetchall()}
-        required = {
-            "policies", "objectives", "documents", "audit_plan", "audits",
-            "nonconformities", "capa", "knowledge_base", "reports",
-            "notifications", "signatures"
-        }
-        missing = required - names
-        if missing:
-            print("[SELFTEST] Missing tables:", ", ".join(sorted(missing)))
-            return 2
-        print(f"[SELFTEST] OK: schema present; Qt API={QT_API}; headless={HEADLESS}")
-        return 0
-    except Exception as e:
-        print("[SELFTEST] ERROR:", e)
-        return 1
-
-def selftest_extended() -> int:
-    """Test: insert a sample record and read it back (policies table)."""
-    try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("INSERT INTO policies(title, body, version, approved_by, approved_on) VALUES (?,?,?,?,date('now'))",
-                    ("Quality Policy", "Initial test policy", "v1", "Head of Division",))
-        con.commit()
-        cur.execute("SELECT COUNT(*) FROM policies")
-        cnt = cur.fetchone()[0]
-        print(f"[SELFTEST-EXT] Policies rows: {cnt}")
-        con.close()
-        return 0
-    except Exception as e:
-        print("[SELFTEST-EXT] ERROR:", e)
-        return 1
-
-def selftest_nc() -> int:
-    """Test: insert NC + CAPA and verify linkage."""
-    try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("INSERT INTO nonconformities(date, description, root_cause, owner, due_date, status, related_audit) VALUES (date('now'), ?, ?, ?, date('now','+7 day'), 'Open', 1)",
-                    ("Sample NC", "Root cause test", "Quality Team"))
-        nc_id = cur.lastrowid
-        cur.execute("INSERT INTO capa(nc_id, action, owner, due_date, status) VALUES (?,?,?,?,?)",
-                    (nc_id, "Corrective action", "Quality Team", "2099-01-01", "Planned"))
-        con.commit()
-        cur.execute("SELECT COUNT(*) FROM capa WHERE nc_id=?", (nc_id,))
-        cnt = cur.fetchone()[0]
-        print(f"[SELFTEST-NC] CAPA linked rows: {cnt}")
-        con.close()
-        return 0 if cnt >= 1 else 2
-    except Exception as e:
-        print("[SELFTEST-NC] ERROR:", e)
-        return 1
-
-def selftest_notify() -> int:
-    """Test: add notification and mark as seen (simulated)."""
-    try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("INSERT INTO notifications(title, due_date, assigned_to, seen) VALUES ('Review documents', date('now','+3 day'), 'Quality Team', 0)")
-        nid = cur.lastrowid
-        cur.execute("UPDATE notifications SET seen=1 WHERE id=?", (nid,))
-        con.commit()
-        cur.execute("SELECT seen FROM notifications WHERE id=?", (nid,))
-        seen = cur.fetchone()[0]
-        print(f"[SELFTEST-NOTIFY] Notification seen={seen}")
-        con.close()
-        return 0 if int(seen) == 1 else 2
-    except Exception as e:
-        print("[SELFTEST-NOTIFY] ERROR:", e)
-        return 1
-
-def cli_usage():
-    print(
-        "Usage:\n"
-        "  python main.py --selftest            # basic DB/schema test\n"
-        "  python main.py --selftest-extended   # insert & count sample row (policies)\n"
-        "  python main.py --selftest-nc         # insert NC & CAPA and verify linkage\n"
-        "  python main.py --selftest-notify     # add notification and mark as seen\n"
-        "  python main.py --import-docs <folder>  # bulk create document records from files (pdf/xlsx/docx/...)\n"
-        "  python main.py --import-csv <table> <csvpath>  # import CSV into a table (columns by header names)\n"
-        "  python main.py --import-xlsx <table> <xlsxpath>  # import Excel into a table (requires pandas+openpyxl)\n"
-        "  python main.py                        # launch GUI if Qt available; otherwise stay in headless mode"
-    )
-
-# ================================================================
-# App Entry
-# ================================================================
-
-def main() -> int:
-    # Self-tests & imports path
-    if len(sys.argv) > 1:
-        arg = sys.argv[1]
-        if arg == "--selftest":
-            return selftest_basic()
-        if arg == "--selftest-extended":
-            return selftest_extended()
-        if arg == "--selftest-nc":
-            return selftest_nc()
-        if arg == "--selftest-notify":
-            return selftest_notify()
-        if arg == "--import-docs" and len(sys.argv) >= 3:
-            folder = sys.argv[2]
-            ensure_schema_sqlite3()
-            count = 0
-            if os.path.isdir(folder):
-                con = sqlite3.connect(DB_NAME)
-                cur = con.cursor()
-                for name in os.listdir(folder):
-                    path = os.path.join(folder, name)
-                    if not os.path.isfile(path):
-                        continue
-                    ext = os.path.splitext(name)[1].lower()
-                    if ext in (".pdf", ".xlsx", ".xls", ".doc", ".docx", ".ppt", ".pptx", ".png", ".jpg", ".jpeg"):
-                        cur.execute(
-                            "INSERT INTO documents(name, code, version, owner, status, review_date, file_path) VALUES (?,?,?,?,?,?,?)",
-                            (name, "", "v1", "Quality Team", "New", None, os.path.abspath(path))
-                        )
-                        count += 1
-                con.commit(); con.close()
-                print(f"[IMPORT-DOCS] Inserted {count} document records from {folder}")
-                return 0
-            else:
-                print("[IMPORT-DOCS] Folder not found:", folder)
-                return 2
-        if arg == "--import-csv" and len(sys.argv) >= 4:
-            table = sys.argv[2]; csvpath = sys.argv[3]
-            ensure_schema_sqlite3()
-            if not os.path.exists(csvpath):
-                print("[IMPORT-CSV] File not found:", csvpath); return 2
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            with open(csvpath, newline='', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                if not rows:
-                    print("[IMPORT-CSV] CSV is empty"); return 2
-                cur.execute(f"PRAGMA table_info({table})")
-                cols = [r[1] for r in cur.fetchall()]
-                placeholders = ",".join(["?"] * len(cols))
-                sql = f"INSERT INTO {table}({','.join(cols)}) VALUES ({placeholders})"
-                imported = 0
-                for r in rows:
-                    vals = [r.get(c, None) for c in cols]
-                    try:
-                        cur.execute(sql, vals)
-                        imported += 1
-                    except Exception:
-                        pass
-                con.commit(); con.close()
-                print(f"[IMPORT-CSV] Imported {imported} rows from {csvpath}")
-                return 0
-        if arg == "--import-xlsx" and len(sys.argv) >= 4:
-            table = sys.argv[2]; xlsxpath = sys.argv[3]
-            ensure_schema_sqlite3()
-            if not HAS_PANDAS:
-                print("[IMPORT-XLSX] Requires pandas+openpyxl"); return 2
-            if not os.path.exists(xlsxpath):
-                print("[IMPORT-XLSX] File not found:", xlsxpath); return 2
-            try:
-                df = pd.read_excel(xlsxpath, dtype=str)
-            except Exception as e:
-                print("[IMPORT-XLSX] Read error:", e); return 2
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            cur.execute(f"PRAGMA table_info({table})")
-            cols = [r[1] for r in cur.fetchall()]
-            df_cols_norm = {c.lower().strip(): c for c in df.columns}
-            mapped = [df_cols_norm.get(c.lower().strip()) for c in cols]
-            placeholders = ",".join(["?"] * len(cols))
-            sql = f"INSERT INTO {table}({','.join(cols)}) VALUES ({placeholders})"
-            imported = 0
-            for _, rec in df.iterrows():
-                vals = [rec[m] if (m in df.columns) else None for m in mapped]
-                try:
-                    cur.execute(sql, vals)
-                    imported += 1
-                except Exception:
-                    pass
-            con.commit(); con.close()
-            print(f"[IMPORT-XLSX] Imported {imported} rows from {xlsxpath}")
-            return 0
-
-    # If Qt available -> GUI
-    try:
-        ensure_schema_qt()
-    except Exception:
-        pass
-    app = QApplication(sys.argv)
-    win = MainWindow()
-    win.show()
-    return app.exec()
-
-if __name__ == "__main__":
-    sys.exit(main())
-=======
-# QMS System - Thi Qar Oil Company (Quality & Performance Division)
-# GUI if Qt is available (PyQt6 preferred, fallback to PyQt5). Otherwise, run in CLI/headless mode.
-# SQLite backend + centered company logo + optional background music (GUI only)
-# Designed by Chief Engineer Tareq Majeed Al-Karimi
-
-import sys, os, csv, shutil, sqlite3
-
-# -------- Optional Excel support --------
 try:
-    import pandas as pd  # requires openpyxl for .xlsx
-    HAS_PANDAS = True
+    import openpyxl  # read-only streaming for large .xlsx files
+    HAS_OPENPYXL = True
 except Exception:
-    pd = None
-    HAS_PANDAS = False
+    openpyxl = None
+    HAS_OPENPYXL = False
 
 # ================================================================
 # Qt Compatibility Layer (may be unavailable in this environment)
@@ -1270,6 +83,15 @@ except Exception:
 
 APP_TITLE = "QMS – Quality & Performance Division | Thi Qar Oil Company"
 DB_NAME = "qms.sqlite"
+# qms.sqlite is usually opened from a network share, where SQLite cannot use
+# WAL (it needs shared memory on the host that owns the file), so the default is
+# the rollback journal. Set QMS_JOURNAL_MODE=WAL when the file is on a local disk
+# to let readers and the writer work concurrently.
+DB_JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "WAL")
+DB_JOURNAL_MODE = os.environ.get("QMS_JOURNAL_MODE", "DELETE").strip().upper()
+if DB_JOURNAL_MODE not in DB_JOURNAL_MODES:
+    sys.exit(f"QMS_JOURNAL_MODE must be one of {', '.join(DB_JOURNAL_MODES)}, not {DB_JOURNAL_MODE!r}")
+DB_BUSY_TIMEOUT_MS = 5000
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 LOGO_PATHS = [
@@ -1445,31 +267,260 @@ SCHEMA_SQL = [
 ]
 
 # ================================================================
-# DB Helpers (Qt or sqlite3)
+# SQLite connections (same settings on every code path)
 # ================================================================
-
-def ensure_schema_sqlite3():
-    con = sqlite3.connect(DB_NAME)
+DB_PRAGMAS = [
+    "PRAGMA cache_size=-65536",     # 64 MiB page cache (negative = KiB)
+    "PRAGMA temp_store=MEMORY",
+]
+if DB_JOURNAL_MODE == "WAL":  # local disk only, see QMS_JOURNAL_MODE
+    DB_PRAGMAS += [
+        "PRAGMA synchronous=NORMAL",    # safe with WAL; fsync at checkpoints only
+        "PRAGMA mmap_size=268435456",   # 256 MiB memory-mapped reads
+    ]
+
+def connect_db(path=None) -> sqlite3.Connection:
+    """Open a connection with the shared journal mode, pragmas and busy timeout."""
+    con = sqlite3.connect(path or DB_NAME, timeout=DB_BUSY_TIMEOUT_MS / 1000)
+    con.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+    for pragma in DB_PRAGMAS:
+        con.execute(pragma)
+    return con
+
+@contextmanager
+def db_connection(path=None):
+    """with db_connection() as con: ...
+    Commits when the block finishes, rolls back if it raises, and always closes."""
+    con = connect_db(path)
     try:
-        cur = con.cursor()
-        for sql in SCHEMA_SQL:
-            cur.executescript(sql)
+        yield con
         con.commit()
+    except BaseException:
+        con.rollback()
+        raise
     finally:
         con.close()
 
+# ================================================================
+# Migrations (tracked with PRAGMA user_version)
+# ================================================================
+# MIGRATIONS[i] upgrades the schema from version i to i+1. Append new steps
+# at the end and never edit a step that has shipped: existing qms.sqlite files
+# are upgraded in place on startup by running only the steps they are missing.
+MIGRATIONS = [
+    # v1: indexes on foreign-key, status and date columns
+    [
+        "CREATE INDEX IF NOT EXISTS idx_documents_code ON documents(code)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status)",
+        "CREATE INDEX IF NOT EXISTS idx_documents_review_date ON documents(review_date)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_plan_status ON audit_plan(status)",
+        "CREATE INDEX IF NOT EXISTS idx_audit_plan_planned_date ON audit_plan(planned_date)",
+        "CREATE INDEX IF NOT EXISTS idx_audits_status ON audits(status)",
+        "CREATE INDEX IF NOT EXISTS idx_audits_audit_date ON audits(audit_date)",
+        "CREATE INDEX IF NOT EXISTS idx_nonconformities_related_audit ON nonconformities(related_audit)",
+        "CREATE INDEX IF NOT EXISTS idx_nonconformities_status ON nonconformities(status)",
+        "CREATE INDEX IF NOT EXISTS idx_nonconformities_due_date ON nonconformities(due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_capa_nc_id ON capa(nc_id)",
+        "CREATE INDEX IF NOT EXISTS idx_capa_status ON capa(status)",
+        "CREATE INDEX IF NOT EXISTS idx_capa_due_date ON capa(due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_due_date ON notifications(due_date)",
+        "CREATE INDEX IF NOT EXISTS idx_notifications_seen_due ON notifications(seen, due_date)",
+    ],
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def apply_migrations(con) -> int:
+    """Upgrade an open sqlite3 connection to SCHEMA_VERSION; returns the final version.
+    Each step runs in its own transaction together with its user_version bump,
+    so an interrupted upgrade resumes from the last completed step."""
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    while version < SCHEMA_VERSION:
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            # re-read under the write lock: another process may have migrated meanwhile
+            version = con.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                for sql in MIGRATIONS[version]:
+                    con.execute(sql)
+                version += 1
+                con.execute(f"PRAGMA user_version = {version}")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    return version
+
+# ================================================================
+# DB Helpers (Qt or sqlite3)
+# ================================================================
+_schema_ready = False
+
+def ensure_schema() -> None:
+    """Create the tables and apply pending migrations, once per process.
+    A database already stamped with SCHEMA_VERSION is left untouched (a single
+    read of user_version, no write lock), so only new or outdated files pay for
+    the CREATE TABLE pass. Schema changes therefore belong in MIGRATIONS."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with db_connection() as con:
+        if con.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            con.execute("BEGIN IMMEDIATE")
+            for sql in SCHEMA_SQL:
+                con.execute(sql)
+            con.commit()
+            apply_migrations(con)
+    _schema_ready = True
+
+# ================================================================
+# Bulk import (CSV / Excel -> table)
+# ================================================================
+IMPORT_BATCH_ROWS = 5000
+
+def table_columns(con, table: str) -> list[str]:
+    """Column names of table; ValueError if there is no such table."""
+    cols = [r[1] for r in con.execute(f"PRAGMA table_info({table})")]
+    if not cols:
+        raise ValueError(f"Unknown table: {table}")
+    return cols
+
+def rejects_path(source: str) -> str:
+    """Side file for rows SQLite refused: data.csv -> data.rejected.csv"""
+    return os.path.splitext(source)[0] + ".rejected.csv"
+
+def bulk_insert(con, table: str, cols: list[str], rows, source: str, batch: int = IMPORT_BATCH_ROWS):
+    """Insert (line, values) pairs into table inside one transaction.
+    Rows are consumed lazily and sent to executemany in batches. When SQLite
+    refuses a batch it is rolled back to its savepoint and replayed row by row,
+    so the good rows still land and each bad one is written, with the error, to
+    rejects_path(source). Returns (imported, rejected, rejects file or None)."""
+    sql = f"INSERT INTO {table}({','.join(cols)}) VALUES ({','.join(['?'] * len(cols))})"
+    out_path = rejects_path(source)
+    if os.path.exists(out_path):
+        os.remove(out_path)  # stale report from an earlier run
+    out = writer = None
+    imported = rejected = 0
+    rows = iter(rows)
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        while True:
+            chunk = list(itertools.islice(rows, batch))
+            if not chunk:
+                break
+            con.execute("SAVEPOINT import_batch")
+            try:
+                con.executemany(sql, [vals for _, vals in chunk])
+                imported += len(chunk)
+            except sqlite3.Error:
+                con.execute("ROLLBACK TO import_batch")
+                for line, vals in chunk:
+                    try:
+                        con.execute(sql, vals)
+                        imported += 1
+                    except sqlite3.Error as e:
+                        if writer is None:
+                            out = open(out_path, "w", newline="", encoding="utf-8-sig")
+                            writer = csv.writer(out)
+                            writer.writerow(["line", "error"] + cols)
+                        writer.writerow([line, str(e)] + list(vals))
+                        rejected += 1
+            con.execute("RELEASE import_batch")
+    finally:
+        if out is not None:
+            out.close()
+    return imported, rejected, (out_path if rejected else None)
+
+def import_csv_file(path: str, table: str, cols: list[str] | None = None):
+    """Stream a CSV (columns matched by header name) into table; see bulk_insert.
+    cols defaults to every column of the table. Returns None when the file has
+    no data rows (empty, or a header line only)."""
+    with open(path, newline="", encoding="utf-8-sig") as f, db_connection() as con:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames:
+            return None
+        cols = cols or table_columns(con, table)
+        # empty cells become NULL, as in the Excel import; reader.line_num is
+        # read as each row is pulled, so it tracks multi-line fields
+        rows = ((reader.line_num, [r.get(c) or None for c in cols]) for r in reader)
+        first = next(rows, None)
+        if first is None:
+            return None
+        return bulk_insert(con, table, cols, itertools.chain([first], rows), path)
+
+XLSX_STREAM_MB = 20  # larger .xlsx files are streamed with openpyxl instead of loaded by pandas
+
+def _excel_key(name) -> str:
+    return str(name).lower().strip()
+
+def excel_rows_pandas(path: str, cols: list[str]):
+    """Load the first sheet with pandas and return (line, values) pairs for cols.
+    Columns are matched once by name (case-insensitive); NaN becomes NULL for
+    the whole frame in one step and rows come straight from itertuples.
+    Rows with no value in any mapped column are skipped."""
+    df = pd.read_excel(path, dtype=str)
+    df.columns = [_excel_key(c) for c in df.columns]
+    df = df.loc[:, ~df.columns.duplicated(keep="last")]
+    frame = df.reindex(columns=[_excel_key(c) for c in cols]).dropna(how="all").astype(object)
+    frame = frame.where(frame.notna(), None)
+    # line 1 is the header row; the index still counts the dropped rows
+    return zip((i + 2 for i in frame.index), frame.itertuples(index=False, name=None))
+
+def excel_rows_stream(path: str, cols: list[str]):
+    """Yield (line, values) pairs from the first sheet with openpyxl in read-only
+    mode, one row in memory at a time. Cells are passed as text, as with pandas.
+    Rows with no value in any mapped column (read-only mode reports formatted
+    but empty rows at the end of a sheet) are skipped."""
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None) or ()
+        by_key = {_excel_key(h): i for i, h in enumerate(header) if h is not None}
+        idx = [by_key.get(_excel_key(c)) for c in cols]
+        for line, rec in enumerate(rows, start=2):
+            vals = [rec[i] if i is not None and i < len(rec) else None for i in idx]
+            vals = [None if v is None or v == "" else str(v) for v in vals]
+            if any(v is not None for v in vals):
+                yield line, vals
+    finally:
+        wb.close()
+
+def excel_rows(path: str, cols: list[str]):
+    streamable = HAS_OPENPYXL and path.lower().endswith((".xlsx", ".xlsm"))
+    if streamable and (not HAS_PANDAS or os.path.getsize(path) > XLSX_STREAM_MB * 1024 * 1024):
+        return excel_rows_stream(path, cols)
+    if not HAS_PANDAS:
+        raise RuntimeError("Excel import requires pandas+openpyxl (.xls files need pandas+xlrd)")
+    return excel_rows_pandas(path, cols)
+
+def import_excel_file(path: str, table: str, cols: list[str] | None = None):
+    """Import the first sheet of a workbook into table (columns matched by header
+    name, case-insensitive); see bulk_insert."""
+    if cols is None:
+        with db_connection() as con:
+            cols = table_columns(con, table)
+    # read before taking the write lock (the pandas path loads the whole sheet here)
+    rows = excel_rows(path, cols)
+    with db_connection() as con:
+        return bulk_insert(con, table, cols, rows, path)
+
+def import_summary(imported: int, rejected: int, rejects: str | None, source: str) -> str:
+    msg = f"Imported {imported} rows from {os.path.basename(source)}"
+    if rejected:
+        msg += f"; {rejected} rejected rows written to {rejects}"
+    return msg
+
 if not HEADLESS:
     def get_db_connection_qt():
         db = QSqlDatabase.addDatabase("QSQLITE")
         db.setDatabaseName(DB_NAME)
+        db.setConnectOptions(f"QSQLITE_BUSY_TIMEOUT={DB_BUSY_TIMEOUT_MS}")
         if not db.open():
             raise RuntimeError("Failed to open database")
+        QSqlQuery(db).exec(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+        for pragma in DB_PRAGMAS:
+            QSqlQuery(db).exec(pragma)
         return db
 
-    def ensure_schema_qt():
-        for sql in SCHEMA_SQL:
-            QSqlQuery().exec(sql)
-
 # ================================================================
 # GUI Implementation (only if Qt available)
 # ================================================================
@@ -1645,28 +696,17 @@ if not HEADLESS:
             path, _ = QFileDialog.getOpenFileName(self, "Import CSV", "", "CSV Files (*.csv)")
             if not path:
                 return
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
             cols = [self.model.record().fieldName(c) for c in range(self.model.columnCount())]
-            with open(path, newline='', encoding="utf-8-sig") as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                if not rows:
-                    QMessageBox.information(self, "Import", "CSV is empty.")
-                    con.close(); return
-                placeholders = ",".join(["?"] * len(cols))
-                sql = f"INSERT INTO {self.table_name}({','.join(cols)}) VALUES ({placeholders})"
-                imported = 0
-                for r in rows:
-                    vals = [r.get(c, None) for c in cols]
-                    try:
-                        cur.execute(sql, vals)
-                        imported += 1
-                    except Exception:
-                        pass
-                con.commit(); con.close()
+            try:
+                result = import_csv_file(path, self.table_name, cols)
+            except Exception as e:
+                QMessageBox.critical(self, "Import Error", str(e))
+                return
+            if result is None:
+                QMessageBox.information(self, "Import", "CSV is empty.")
+                return
             self.model.select()
-            QMessageBox.information(self, "Import", f"Imported {imported} rows from {os.path.basename(path)}")
+            QMessageBox.information(self, "Import", import_summary(*result, path))
 
         def import_excel(self):
             if not self._require_unlocked():
@@ -1674,7 +714,7 @@ if not HEADLESS:
             path, _ = QFileDialog.getOpenFileName(self, "Import Excel", "", "Excel Files (*.xlsx *.xls)")
             if not path:
                 return
-            if not HAS_PANDAS:
+            if not (HAS_PANDAS or HAS_OPENPYXL):
                 QMessageBox.critical(
                     self,
                     "Excel Support Missing",
@@ -1682,48 +722,14 @@ if not HEADLESS:
                     "Install with: pip install pandas openpyxl"
                 )
                 return
+            table_cols = [self.model.record().fieldName(c) for c in range(self.model.columnCount())]
             try:
-                df = pd.read_excel(path, dtype=str)
+                result = import_excel_file(path, self.table_name, table_cols)
             except Exception as e:
-                QMessageBox.critical(self, "Read Excel Error", str(e))
+                QMessageBox.critical(self, "Import Excel Error", str(e))
                 return
-
-            # Map columns by name (case-insensitive)
-            df_cols_norm = {c.lower().strip(): c for c in df.columns}
-            table_cols = [self.model.record().fieldName(c) for c in range(self.model.columnCount())]
-            mapped_cols = []
-            for c in table_cols:
-                key = c.lower().strip()
-                src = df_cols_norm.get(key)
-                mapped_cols.append(src)
-
-            rows = []
-            for _, rec in df.iterrows():
-                vals = [rec[src] if (src in df.columns) else None for src in mapped_cols]
-                rows.append(vals)
-
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            placeholders = ",".join(["?"] * len(table_cols))
-            sql = f"INSERT INTO {self.table_name}({','.join(table_cols)}) VALUES ({placeholders})"
-            imported = 0
-            for vals in rows:
-                try:
-                    norm_vals = []
-                    for v in vals:
-                        if HAS_PANDAS and isinstance(v, float) and pd.isna(v):
-                            norm_vals.append(None)
-                        else:
-                            norm_vals.append(v)
-                    cur.execute(sql, norm_vals)
-                    imported += 1
-                except Exception:
-                    pass
-            con.commit()
-            con.close()
-
             self.model.select()
-            QMessageBox.information(self, "Import", f"Imported {imported} rows from {os.path.basename(path)}")
+            QMessageBox.information(self, "Import", import_summary(*result, path))
 
         # ---- Documents-specific helpers ----
         def _selected_row_id(self):
@@ -1914,14 +920,11 @@ if not HEADLESS:
             if not self.unlocked:
                 QMessageBox.warning(self, "Locked", "Unlock this section first.")
                 return
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            cur.execute(
-                "INSERT INTO signatures(person, role, image_path, signed_on) VALUES (?,?,?,date('now'))",
-                (self.person.text(), self.role.text(), self.image_path.text())
-            )
-            con.commit()
-            con.close()
+            with db_connection() as con:
+                con.execute(
+                    "INSERT INTO signatures(person, role, image_path, signed_on) VALUES (?,?,?,date('now'))",
+                    (self.person.text(), self.role.text(), self.image_path.text())
+                )
             QMessageBox.information(self, "Saved", "Signature saved.")
             self.person.clear(); self.role.clear(); self.image_path.clear()
 
@@ -2185,21 +1188,26 @@ if not HEADLESS:
 def selftest_basic() -> int:
     """Test: create/open DB and ensure all tables exist."""
     try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        names = {r[0] for r in cur.fetchall()}
-        required = {
-            "policies", "objectives", "documents", "audit_plan", "audits",
-            "nonconformities", "capa", "knowledge_base", "reports",
-            "notifications", "signatures"
-        }
-        missing = required - names
-        if missing:
-            print("[SELFTEST] Missing tables:", ", ".join(sorted(missing)))
+        ensure_schema()
+        with db_connection() as con:
+            cur = con.cursor()
+            cur.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            names = {r[0] for r in cur.fetchall()}
+            required = {
+                "policies", "objectives", "documents", "audit_plan", "audits",
+                "nonconformities", "capa", "knowledge_base", "reports",
+                "notifications", "signatures"
+            }
+            missing = required - names
+            if missing:
+                print("[SELFTEST] Missing tables:", ", ".join(sorted(missing)))
+                return 2
+            cur.execute("PRAGMA user_version")
+            version = cur.fetchone()[0]
+        if version != SCHEMA_VERSION:
+            print(f"[SELFTEST] Schema version {version}, expected {SCHEMA_VERSION}")
             return 2
-        print(f"[SELFTEST] OK: schema present; Qt API={QT_API}; headless={HEADLESS}")
+        print(f"[SELFTEST] OK: schema v{version} present; Qt API={QT_API}; headless={HEADLESS}")
         return 0
     except Exception as e:
         print("[SELFTEST] ERROR:", e)
@@ -2208,16 +1216,14 @@ def selftest_basic() -> int:
 def selftest_extended() -> int:
     """Test: insert a sample record and read it back (policies table)."""
     try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("INSERT INTO policies(title, body, version, approved_by, approved_on) VALUES (?,?,?,?,date('now'))",
-                    ("Quality Policy", "Initial test policy", "v1", "Head of Division",))
-        con.commit()
-        cur.execute("SELECT COUNT(*) FROM policies")
-        cnt = cur.fetchone()[0]
-        print(f"[SELFTEST-EXT] Policies rows: {cnt}")
-        con.close()
+        ensure_schema()
+        with db_connection() as con:
+            cur = con.cursor()
+            cur.execute("INSERT INTO policies(title, body, version, approved_by, approved_on) VALUES (?,?,?,?,date('now'))",
+                        ("Quality Policy", "Initial test policy", "v1", "Head of Division",))
+            cur.execute("SELECT COUNT(*) FROM policies")
+            cnt = cur.fetchone()[0]
+            print(f"[SELFTEST-EXT] Policies rows: {cnt}")
         return 0
     except Exception as e:
         print("[SELFTEST-EXT] ERROR:", e)
@@ -2226,19 +1232,17 @@ def selftest_extended() -> int:
 def selftest_nc() -> int:
     """Test: insert NC + CAPA and verify linkage."""
     try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("INSERT INTO nonconformities(date, description, root_cause, owner, due_date, status, related_audit) VALUES (date('now'), ?, ?, ?, date('now','+7 day'), 'Open', 1)",
-                    ("Sample NC", "Root cause test", "Quality Team"))
-        nc_id = cur.lastrowid
-        cur.execute("INSERT INTO capa(nc_id, action, owner, due_date, status) VALUES (?,?,?,?,?)",
-                    (nc_id, "Corrective action", "Quality Team", "2099-01-01", "Planned"))
-        con.commit()
-        cur.execute("SELECT COUNT(*) FROM capa WHERE nc_id=?", (nc_id,))
-        cnt = cur.fetchone()[0]
-        print(f"[SELFTEST-NC] CAPA linked rows: {cnt}")
-        con.close()
+        ensure_schema()
+        with db_connection() as con:
+            cur = con.cursor()
+            cur.execute("INSERT INTO nonconformities(date, description, root_cause, owner, due_date, status, related_audit) VALUES (date('now'), ?, ?, ?, date('now','+7 day'), 'Open', 1)",
+                        ("Sample NC", "Root cause test", "Quality Team"))
+            nc_id = cur.lastrowid
+            cur.execute("INSERT INTO capa(nc_id, action, owner, due_date, status) VALUES (?,?,?,?,?)",
+                        (nc_id, "Corrective action", "Quality Team", "2099-01-01", "Planned"))
+            cur.execute("SELECT COUNT(*) FROM capa WHERE nc_id=?", (nc_id,))
+            cnt = cur.fetchone()[0]
+            print(f"[SELFTEST-NC] CAPA linked rows: {cnt}")
         return 0 if cnt >= 1 else 2
     except Exception as e:
         print("[SELFTEST-NC] ERROR:", e)
@@ -2247,22 +1251,113 @@ def selftest_nc() -> int:
 def selftest_notify() -> int:
     """Test: add notification and mark as seen (simulated)."""
     try:
-        ensure_schema_sqlite3()
-        con = sqlite3.connect(DB_NAME)
-        cur = con.cursor()
-        cur.execute("INSERT INTO notifications(title, due_date, assigned_to, seen) VALUES ('Review documents', date('now','+3 day'), 'Quality Team', 0)")
-        nid = cur.lastrowid
-        cur.execute("UPDATE notifications SET seen=1 WHERE id=?", (nid,))
-        con.commit()
-        cur.execute("SELECT seen FROM notifications WHERE id=?", (nid,))
-        seen = cur.fetchone()[0]
-        print(f"[SELFTEST-NOTIFY] Notification seen={seen}")
-        con.close()
+        ensure_schema()
+        with db_connection() as con:
+            cur = con.cursor()
+            cur.execute("INSERT INTO notifications(title, due_date, assigned_to, seen) VALUES ('Review documents', date('now','+3 day'), 'Quality Team', 0)")
+            nid = cur.lastrowid
+            cur.execute("UPDATE notifications SET seen=1 WHERE id=?", (nid,))
+            cur.execute("SELECT seen FROM notifications WHERE id=?", (nid,))
+            seen = cur.fetchone()[0]
+            print(f"[SELFTEST-NOTIFY] Notification seen={seen}")
         return 0 if int(seen) == 1 else 2
     except Exception as e:
         print("[SELFTEST-NOTIFY] ERROR:", e)
         return 1
 
+def selftest_import() -> int:
+    """Test: CSV import across several batches, with bad rows replayed and
+    written to the .rejected.csv side file."""
+    try:
+        ensure_schema()
+        with db_connection() as con:
+            start = con.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM policies").fetchone()[0]
+        total = IMPORT_BATCH_ROWS * 2 + 10
+        bad = {IMPORT_BATCH_ROWS + 7: "NOT NULL", IMPORT_BATCH_ROWS + 8: "UNIQUE"}  # file lines
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, "policies.csv")
+                with open(path, "w", newline="", encoding="utf-8") as f:
+                    w = csv.writer(f)
+                    w.writerow(["id", "title", "body"])
+                    header_only = f.tell()
+                    for i in range(total):
+                        line = i + 2
+                        pid = start if bad.get(line) == "UNIQUE" else start + i
+                        title = "" if bad.get(line) == "NOT NULL" else f"Bulk {i}"
+                        w.writerow([pid, title, "selftest"])
+                imported, rejected, rejects = import_csv_file(path, "policies")
+                with open(rejects, newline="", encoding="utf-8-sig") as f:
+                    report = list(csv.reader(f))
+                with open(path, "r+", encoding="utf-8") as f:
+                    f.truncate(header_only)
+                empty = import_csv_file(path, "policies")
+            with db_connection() as con:
+                stored = con.execute("SELECT COUNT(*) FROM policies WHERE id >= ?", (start,)).fetchone()[0]
+        finally:
+            with db_connection() as con:
+                con.execute("DELETE FROM policies WHERE id >= ?", (start,))
+        print(f"[SELFTEST-IMPORT] Imported {imported} rows, rejected {rejected}, stored {stored}")
+        expected = [["line", "error", "id", "title", "body"]] + [[str(line)] for line in sorted(bad)]
+        ok = (
+            (imported, rejected, stored) == (total - len(bad), len(bad), total - len(bad))
+            and [r[:1] if i else r[:5] for i, r in enumerate(report)] == expected
+            and all(kind in r[1] for r, kind in zip(report[1:], (bad[k] for k in sorted(bad))))
+            and empty is None
+        )
+        if not ok:
+            print("[SELFTEST-IMPORT] Unexpected rejects report or counts:", report, empty)
+        return 0 if ok else 2
+    except Exception as e:
+        print("[SELFTEST-IMPORT] ERROR:", e)
+        return 1
+
+def selftest_xlsx() -> int:
+    """Test: import a small workbook with formatted blank rows after the data;
+    the imported rows are removed again."""
+    if not HAS_OPENPYXL:
+        print("[SELFTEST-XLSX] SKIPPED: openpyxl not installed")
+        return 0
+    try:
+        ensure_schema()
+        with db_connection() as con:
+            start = con.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM policies").fetchone()[0]
+        cols = ["title", "body", "version"]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "policies.xlsx")
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            ws.append(["Title", "Body", "Version", "Ignored"])
+            ws.append(["Policy A", "Body A", "v1", "x"])
+            ws.append(["Policy B", None, "v2", "x"])
+            ws.append([None, None, None, "only an unmapped column"])
+            ws.append(["Policy C", "Body C", None, None])
+            # formatted but empty cells: read-only openpyxl reports these rows
+            for r in range(6, 26):
+                for c in range(1, 4):
+                    ws.cell(row=r, column=c).font = openpyxl.styles.Font(bold=True)
+            wb.save(path)
+            readers = {"stream": excel_rows_stream}
+            if HAS_PANDAS:
+                readers["pandas"] = excel_rows_pandas
+            for name, read in readers.items():
+                lines = [line for line, _ in read(path, cols)]
+                if lines != [2, 3, 5]:
+                    print(f"[SELFTEST-XLSX] {name} rows at lines {lines}, expected [2, 3, 5]")
+                    return 2
+            try:
+                imported, rejected, _ = import_excel_file(path, "policies", cols)
+                with db_connection() as con:
+                    stored = con.execute("SELECT COUNT(*) FROM policies WHERE id >= ?", (start,)).fetchone()[0]
+            finally:
+                with db_connection() as con:
+                    con.execute("DELETE FROM policies WHERE id >= ?", (start,))
+        print(f"[SELFTEST-XLSX] Imported {imported} rows, rejected {rejected}, stored {stored} ({', '.join(readers)})")
+        return 0 if (imported, rejected, stored) == (3, 0, 3) else 2
+    except Exception as e:
+        print("[SELFTEST-XLSX] ERROR:", e)
+        return 1
+
 def cli_usage():
     print(
         "Usage:\n"
@@ -2270,10 +1365,14 @@ def cli_usage():
         "  python main.py --selftest-extended   # insert & count sample row (policies)\n"
         "  python main.py --selftest-nc         # insert NC & CAPA and verify linkage\n"
         "  python main.py --selftest-notify     # add notification and mark as seen\n"
+        "  python main.py --selftest-import     # batched CSV import with rejected rows\n"
+        "  python main.py --selftest-xlsx       # import a sample workbook, skipping blank rows\n"
         "  python main.py --import-docs <folder>  # bulk create document records from files (pdf/xlsx/docx/...)\n"
         "  python main.py --import-csv <table> <csvpath>  # import CSV into a table (columns by header names)\n"
         "  python main.py --import-xlsx <table> <xlsxpath>  # import Excel into a table (requires pandas+openpyxl)\n"
-        "  python main.py                        # launch GUI if Qt available; otherwise stay in headless mode"
+        "  python main.py                        # launch GUI if Qt available; otherwise stay in headless mode\n"
+        "Environment:\n"
+        "  QMS_JOURNAL_MODE=DELETE|TRUNCATE|PERSIST|WAL  # SQLite journal (default DELETE; WAL for a local-disk DB only)"
     )
 
 # ================================================================
@@ -2292,25 +1391,28 @@ def main() -> int:
             return selftest_nc()
         if arg == "--selftest-notify":
             return selftest_notify()
+        if arg == "--selftest-import":
+            return selftest_import()
+        if arg == "--selftest-xlsx":
+            return selftest_xlsx()
         if arg == "--import-docs" and len(sys.argv) >= 3:
             folder = sys.argv[2]
-            ensure_schema_sqlite3()
+            ensure_schema()
             count = 0
             if os.path.isdir(folder):
-                con = sqlite3.connect(DB_NAME)
-                cur = con.cursor()
-                for name in os.listdir(folder):
-                    path = os.path.join(folder, name)
-                    if not os.path.isfile(path):
-                        continue
-                    ext = os.path.splitext(name)[1].lower()
-                    if ext in (".pdf", ".xlsx", ".xls", ".doc", ".docx", ".ppt", ".pptx", ".png", ".jpg", ".jpeg"):
-                        cur.execute(
-                            "INSERT INTO documents(name, code, version, owner, status, review_date, file_path) VALUES (?,?,?,?,?,?,?)",
-                            (name, "", "v1", "Quality Team", "New", None, os.path.abspath(path))
-                        )
-                        count += 1
-                con.commit(); con.close()
+                with db_connection() as con:
+                    cur = con.cursor()
+                    for name in os.listdir(folder):
+                        path = os.path.join(folder, name)
+                        if not os.path.isfile(path):
+                            continue
+                        ext = os.path.splitext(name)[1].lower()
+                        if ext in (".pdf", ".xlsx", ".xls", ".doc", ".docx", ".ppt", ".pptx", ".png", ".jpg", ".jpeg"):
+                            cur.execute(
+                                "INSERT INTO documents(name, code, version, owner, status, review_date, file_path) VALUES (?,?,?,?,?,?,?)",
+                                (name, "", "v1", "Quality Team", "New", None, os.path.abspath(path))
+                            )
+                            count += 1
                 print(f"[IMPORT-DOCS] Inserted {count} document records from {folder}")
                 return 0
             else:
@@ -2318,72 +1420,47 @@ def main() -> int:
                 return 2
         if arg == "--import-csv" and len(sys.argv) >= 4:
             table = sys.argv[2]; csvpath = sys.argv[3]
-            ensure_schema_sqlite3()
+            ensure_schema()
             if not os.path.exists(csvpath):
                 print("[IMPORT-CSV] File not found:", csvpath); return 2
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            with open(csvpath, newline='', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                rows = list(reader)
-                if not rows:
-                    print("[IMPORT-CSV] CSV is empty"); return 2
-                cur.execute(f"PRAGMA table_info({table})")
-                cols = [r[1] for r in cur.fetchall()]
-                placeholders = ",".join(["?"] * len(cols))
-                sql = f"INSERT INTO {table}({','.join(cols)}) VALUES ({placeholders})"
-                imported = 0
-                for r in rows:
-                    vals = [r.get(c, None) for c in cols]
-                    try:
-                        cur.execute(sql, vals)
-                        imported += 1
-                    except Exception:
-                        pass
-                con.commit(); con.close()
-                print(f"[IMPORT-CSV] Imported {imported} rows from {csvpath}")
-                return 0
+            try:
+                result = import_csv_file(csvpath, table)
+            except ValueError as e:
+                print("[IMPORT-CSV]", e); return 2
+            if result is None:
+                print("[IMPORT-CSV] CSV is empty"); return 2
+            print("[IMPORT-CSV]", import_summary(*result, csvpath))
+            return 0
         if arg == "--import-xlsx" and len(sys.argv) >= 4:
             table = sys.argv[2]; xlsxpath = sys.argv[3]
-            ensure_schema_sqlite3()
-            if not HAS_PANDAS:
+            ensure_schema()
+            if not (HAS_PANDAS or HAS_OPENPYXL):
                 print("[IMPORT-XLSX] Requires pandas+openpyxl"); return 2
             if not os.path.exists(xlsxpath):
                 print("[IMPORT-XLSX] File not found:", xlsxpath); return 2
             try:
-                df = pd.read_excel(xlsxpath, dtype=str)
+                result = import_excel_file(xlsxpath, table)
             except Exception as e:
                 print("[IMPORT-XLSX] Read error:", e); return 2
-            con = sqlite3.connect(DB_NAME)
-            cur = con.cursor()
-            cur.execute(f"PRAGMA table_info({table})")
-            cols = [r[1] for r in cur.fetchall()]
-            df_cols_norm = {c.lower().strip(): c for c in df.columns}
-            mapped = [df_cols_norm.get(c.lower().strip()) for c in cols]
-            placeholders = ",".join(["?"] * len(cols))
-            sql = f"INSERT INTO {table}({','.join(cols)}) VALUES ({placeholders})"
-            imported = 0
-            for _, rec in df.iterrows():
-                vals = [rec[m] if (m in df.columns) else None for m in mapped]
-                try:
-                    cur.execute(sql, vals)
-                    imported += 1
-                except Exception:
-                    pass
-            con.commit(); con.close()
-            print(f"[IMPORT-XLSX] Imported {imported} rows from {xlsxpath}")
+            print("[IMPORT-XLSX]", import_summary(*result, xlsxpath))
             return 0
 
     # If Qt available -> GUI
     try:
-        ensure_schema_qt()
+        ensure_schema()
     except Exception:
         pass
     app = QApplication(sys.argv)
+    # Default connection used by every QSqlTableModel/QSqlQuery in the pages;
+    # opened here so it carries the busy timeout and pragmas from connect_db.
+    try:
+        get_db_connection_qt()
+    except RuntimeError as e:
+        QMessageBox.critical(None, "Database", str(e))
+        return 1
     win = MainWindow()
     win.show()
     return app.exec()
 
 if __name__ == "__main__":
     sys.exit(main())
->>>>>>> 58e6beb (Add files via upload)
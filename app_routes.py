@@ -0,0 +1,85 @@
+# ------------------------------------------------------------
+# IMS — مسارات HTTP إضافية بجانب Streamlit (تُركَّب عبر st.App في serve.py)
+# تنزيل أرشيفات الأقسام المصدّرة من القرص تدفقًا ثم حذفها،
+# وصور الواجهة المحسّنة بتخزين دائم في المتصفح (Cache-Control: immutable)
+# ------------------------------------------------------------
+
+import os
+import re
+
+from starlette.background import BackgroundTask
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response
+from starlette.routing import Route
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# خارج static/: خادم Streamlit الثابت يرفض الملفات الأكبر من 200MB،
+# ويعطّل static/ كلها عند التشغيل إن تجاوز حجمها 1GB
+EXPORT_DIR = os.path.join(APP_DIR, ".cache", "exports")
+EXPORT_URL = "api/exports"
+
+# نسخ صور الواجهة (hero_assets.build_variants)؛ الاسم يتضمن بصمة المحتوى فلا يتغير
+# محتوى رابط أبدًا، ويمكن للمتصفح تخزينه دون إعادة تحقق
+HERO_DIR = os.path.join(APP_DIR, ".cache", "hero")
+HERO_URL = "api/hero"
+HERO_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# يضبطه serve.py؛ بدونه (streamlit run streamlit_app.py) لا توجد هذه المسارات
+ROUTES_ENV = "IMS_APP_ROUTES"
+
+# <slug>-<YYYYmmdd>-<HHMMSS>-<رمز عشوائي>.zip كما يسميها export_section_zip
+_EXPORT_NAME = re.compile(r"^[A-Za-z0-9_-]+-\d{8}-\d{6}-[0-9a-f]{16}\.zip$")
+# <الاسم>-<بصمة المحتوى>-<العرض>.<الامتداد>
+_HERO_NAME = re.compile(r"^[A-Za-z0-9_-]+-[0-9a-f]{12}-\d+\.(webp|jpg|png)$")
+_HERO_TYPES = {"webp": "image/webp", "jpg": "image/jpeg", "png": "image/png"}
+
+
+def routes_enabled() -> bool:
+    return os.environ.get(ROUTES_ENV) == "1"
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def export_download(request: Request) -> Response:
+    """
+    يرسل الأرشيف من القرص دفعةً دفعة (مع دعم Range لاستئناف التنزيل).
+    بعد إرساله كاملاً بطلب GET عادي يُحذف؛ الأرشيفات المتروكة تُحذف بعد EXPORT_TTL_SECONDS.
+    """
+    name = request.path_params["name"]
+    path = os.path.join(EXPORT_DIR, name)
+    if not _EXPORT_NAME.match(name) or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    slug = name.rsplit("-", 3)[0]
+    whole = request.method == "GET" and "range" not in request.headers
+    return FileResponse(
+        path,
+        media_type="application/zip",
+        filename=f"{slug}.zip",
+        background=BackgroundTask(_remove, path) if whole else None,
+    )
+
+
+async def hero_asset(request: Request) -> Response:
+    name = request.path_params["name"]
+    match = _HERO_NAME.match(name)
+    path = os.path.join(HERO_DIR, name)
+    if not match or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    return FileResponse(
+        path,
+        media_type=_HERO_TYPES[match.group(1)],
+        headers={"Cache-Control": HERO_CACHE_CONTROL},
+    )
+
+
+ROUTES = [
+    Route(f"/{EXPORT_URL}/{{name}}", export_download, methods=["GET"]),
+    Route(f"/{HERO_URL}/{{name}}", hero_asset, methods=["GET"]),
+]
@@ -0,0 +1,596 @@
+# ------------------------------------------------------------
+# IMS — قياس أداء streamlit_app.py عبر AppTest دون شبكة
+# خادم Google Drive وهمي محلي (HTTPS، في عملية مستقلة) مع ملفات بعدد وحجم قابلين
+# للضبط، ويُخرج لكل سيناريو (قائمة، تنزيل، رفع) سطر JSON: زمن إعادة التشغيل،
+# طلبات Drive لكل إعادة تشغيل، البايتات المنقولة، وذروة ذاكرة التطبيق (RSS)
+#
+#   python bench_app.py                       # جميع السيناريوهات
+#   python bench_app.py --scenario list --files 500 --reruns 20
+#   python bench_app.py --backend local       # المخزن المحلي بدل Drive
+#   python bench_app.py --secret SYNC_LISTINGS=false --out results.jsonl
+#
+# يتطلب streamlit (AppTest)، ومع --backend drive أيضًا cryptography (مفتاح حساب
+# الخدمة وشهادة TLS الوهميين)؛ دونها تُسجَّل سيناريوهات Drive متخطاة (skipped)
+# ------------------------------------------------------------
+
+import argparse
+import functools
+import hashlib
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import re
+import resource
+import shutil
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+from PIL import Image
+
+from drive_metrics import quantile
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+SCENARIOS = ("list", "download", "upload")
+ROOT_ID = "bench-root"
+FOLDER_MIME = "application/vnd.google-apps.folder"
+SLUGS = (
+    "policies", "objectives", "docs", "audit-plan", "audits", "nc", "capa",
+    "kb", "reports", "kpi", "esign", "notify", "risks",
+)
+# القسم المختار افتراضيًا في الشريط الجانبي، وكلمة مروره في القياس
+SECTION = "policies"
+PW_KEY = "PW_POLICIES"
+PASSWORD = "bench"
+# عدادات الخادم الوهمي لعملية القياس؛ لا يُحتسب طلبها ضمن طلبات Drive
+STATS_PATH = "/_bench/stats"
+
+
+# ================= خادم Drive الوهمي =================
+
+
+class FakeDrive:
+    """
+    حالة Drive في الذاكرة: ملفات ومجلدات، سجل تغييرات لـ Changes API،
+    وجلسات رفع قابلة للاستئناف. يعدّ كل طلب والبايتات الداخلة والخارجة.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files: Dict[str, dict] = {}
+        self.content: Dict[str, bytes] = {}
+        self.changes: List[str] = []
+        self.uploads: Dict[str, dict] = {}
+        self.calls: Counter = Counter()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._seq = 0
+
+    def _id(self, prefix: str) -> str:
+        self._seq += 1
+        return f"{prefix}{self._seq:06d}"
+
+    def add(self, name: str, parent: str, data: bytes = b"", mime: str = "application/pdf",
+            app_props: Optional[dict] = None) -> dict:
+        with self.lock:
+            fid = self._id("fld" if mime == FOLDER_MIME else "f")
+            meta = {
+                "id": fid,
+                "name": name,
+                "mimeType": mime,
+                "parents": [parent],
+                "trashed": False,
+                "modifiedTime": "2025-01-01T00:00:00.000Z",
+            }
+            if mime != FOLDER_MIME:
+                meta["size"] = str(len(data))
+                meta["md5Checksum"] = hashlib.md5(data).hexdigest()
+                self.content[fid] = data
+            if app_props:
+                meta["appProperties"] = dict(app_props)
+            self.files[fid] = meta
+            self.changes.append(fid)
+            return meta
+
+    def remove(self, fid: str) -> bool:
+        with self.lock:
+            if self.files.pop(fid, None) is None:
+                return False
+            self.content.pop(fid, None)
+            self.changes.append(fid)
+            return True
+
+    def query(self, q: str) -> List[dict]:
+        parents = set(re.findall(r"'([^']+)' in parents", q))
+        mime = re.search(r"mimeType\s*=\s*'([^']+)'", q)
+        with self.lock:
+            out = []
+            for f in self.files.values():
+                if parents and not parents.intersection(f["parents"]):
+                    continue
+                if mime and f["mimeType"] != mime.group(1):
+                    continue
+                out.append(f)
+            return out
+
+
+@functools.lru_cache(maxsize=None)
+def _thumbnail(px: int) -> bytes:
+    """صورة JPEG حقيقية بالحجم المطلوب كما يعيدها Drive (Pillow يأتي مع streamlit)."""
+    buf = io.BytesIO()
+    Image.new("RGB", (px, px * 4 // 3), (18, 59, 87)).save(buf, "JPEG", quality=70)
+    return buf.getvalue()
+
+
+def make_handler(drive: FakeDrive, base: str):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:  # صامت
+            pass
+
+        # ---- أدوات ----
+        def _body(self) -> bytes:
+            n = int(self.headers.get("Content-Length") or 0)
+            data = self.rfile.read(n) if n else b""
+            with drive.lock:
+                drive.bytes_in += len(data)
+            return data
+
+        def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None,
+                  ctype: str = "application/json") -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+            with drive.lock:
+                drive.bytes_out += len(body)
+
+        def _json(self, obj, status: int = 200, headers: Optional[dict] = None) -> None:
+            self._send(status, json.dumps(obj).encode("utf-8"), headers)
+
+        def _count(self, op: str) -> None:
+            with drive.lock:
+                drive.calls[op] += 1
+
+        # ---- الطلبات ----
+        def do_POST(self) -> None:
+            url = urlparse(self.path)
+            qs = parse_qs(url.query)
+            body = self._body()
+            if url.path == "/token":
+                self._count("token")
+                return self._json({"access_token": "bench", "expires_in": 3600, "token_type": "Bearer"})
+            if url.path == "/upload/drive/v3/files" and qs.get("uploadType") == ["resumable"]:
+                self._count("upload_start")
+                meta = json.loads(body or b"{}")
+                with drive.lock:
+                    uid = drive._id("up")
+                    drive.uploads[uid] = {"meta": meta, "data": bytearray()}
+                loc = f"{base}/upload/drive/v3/files?uploadType=resumable&upload_id={uid}"
+                return self._json({}, headers={"Location": loc})
+            self._count("unsupported")
+            self._json({"error": {"code": 501, "message": url.path}}, 501)
+
+        def do_PUT(self) -> None:
+            url = urlparse(self.path)
+            uid = (parse_qs(url.query).get("upload_id") or [""])[0]
+            body = self._body()
+            self._count("upload_chunk")
+            up = drive.uploads.get(uid)
+            if up is None:
+                return self._json({"error": {"code": 404, "message": "upload"}}, 404)
+            m = re.match(r"bytes (\*|(\d+)-(\d+))/(\d+|\*)", self.headers.get("Content-Range", ""))
+            if m and m.group(2) is not None and int(m.group(2)) == len(up["data"]):
+                up["data"] += body
+            total = m.group(4) if m else "*"
+            if total != "*" and len(up["data"]) >= int(total):
+                meta = up["meta"]
+                f = drive.add(meta.get("name", "file"), (meta.get("parents") or [ROOT_ID])[0],
+                              bytes(up["data"]), meta.get("mimeType", "application/octet-stream"),
+                              meta.get("appProperties"))
+                drive.uploads.pop(uid, None)
+                return self._json(f)
+            headers = {"Range": f"bytes=0-{len(up['data']) - 1}"} if up["data"] else {}
+            self._send(308, b"", headers)
+
+        def do_DELETE(self) -> None:
+            url = urlparse(self.path)
+            self._count("delete")
+            fid = url.path.rsplit("/", 1)[-1]
+            if drive.remove(fid):
+                return self._send(204)
+            self._json({"error": {"code": 404, "message": "not found"}}, 404)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            qs = {k: v[0] for k, v in parse_qs(url.query).items()}
+            path = url.path
+            if path == STATS_PATH:
+                with drive.lock:
+                    stats = {"calls": dict(drive.calls), "bytes_in": drive.bytes_in, "bytes_out": drive.bytes_out}
+                body = json.dumps(stats).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            if path == "/drive/v3/files":
+                self._count("files.list")
+                rows = drive.query(qs.get("q", ""))
+                if "name desc" in qs.get("orderBy", ""):
+                    rows.sort(key=lambda f: f["name"], reverse=True)
+                start = int(qs.get("pageToken") or 0)
+                size = int(qs.get("pageSize") or 100)
+                res = {"files": rows[start:start + size]}
+                if start + size < len(rows):
+                    res["nextPageToken"] = str(start + size)
+                return self._json(res)
+            if path == "/drive/v3/changes/startPageToken":
+                self._count("changes.start")
+                return self._json({"startPageToken": str(len(drive.changes))})
+            if path == "/drive/v3/changes":
+                self._count("changes.list")
+                start = int(qs.get("pageToken") or 0)
+                size = int(qs.get("pageSize") or 100)
+                with drive.lock:
+                    ids = drive.changes[start:start + size]
+                    items = []
+                    for fid in ids:
+                        f = drive.files.get(fid)
+                        items.append({"fileId": fid, "removed": f is None, "file": f} if f
+                                     else {"fileId": fid, "removed": True})
+                    end = start + len(ids)
+                    done = end >= len(drive.changes)
+                res = {"changes": items}
+                res["newStartPageToken" if done else "nextPageToken"] = str(end)
+                return self._json(res)
+            m = re.match(r"^/thumb/([^=]+)=s(\d+)$", path)
+            if m:
+                self._count("thumbnail")
+                return self._send(200, _thumbnail(int(m.group(2))), ctype="image/jpeg")
+            m = re.match(r"^/drive/v3/files/([^/]+)$", path)
+            if m:
+                fid = m.group(1)
+                with drive.lock:
+                    f = drive.files.get(fid)
+                    data = drive.content.get(fid, b"")
+                if f is None:
+                    self._count("files.get")
+                    return self._json({"error": {"code": 404, "message": "not found"}}, 404)
+                if qs.get("alt") == "media":
+                    self._count("files.get_media")
+                    rng = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+                    if not rng:
+                        return self._send(200, data, ctype="application/octet-stream")
+                    a = int(rng.group(1))
+                    b = min(int(rng.group(2) or len(data) - 1), len(data) - 1)
+                    return self._send(206, data[a:b + 1], {"Content-Range": f"bytes {a}-{b}/{len(data)}"},
+                                      "application/octet-stream")
+                self._count("files.get")
+                return self._json(dict(f, thumbnailLink=f"{base}/thumb/{fid}=s220"))
+            self._count("unsupported")
+            self._json({"error": {"code": 501, "message": path}}, 501)
+
+    return Handler
+
+
+def make_key_and_cert(workdir: str):
+    """
+    مفتاح RSA واحد لحساب الخدمة الوهمي ولشهادة TLS ذاتية التوقيع لـ 127.0.0.1.
+    TLS مطلوب: googleapiclient يبقي روابط الرفع على https حتى مع DRIVE_API_ENDPOINT.
+    """
+    import datetime
+    import ipaddress
+
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "ims-bench")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), True)
+        .sign(key, hashes.SHA256())
+    )
+    pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    key_path = os.path.join(workdir, "bench-key.pem")
+    cert_path = os.path.join(workdir, "bench-cert.pem")
+    with open(key_path, "wb") as f:
+        f.write(pem)
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    return pem.decode(), key_path, cert_path
+
+
+def _serve_fake_drive(files: int, size: int, key_path: str, cert_path: str, port_out) -> None:
+    """جسم عملية الخادم: يبذر الملفات ويرسل المنفذ ثم يخدم حتى يُنهى."""
+    drive = FakeDrive()
+    drive.files[ROOT_ID] = {"id": ROOT_ID, "name": "IMS-Storage", "mimeType": FOLDER_MIME,
+                            "parents": [], "trashed": False}
+    folders = {s: drive.add(s, ROOT_ID, mime=FOLDER_MIME)["id"] for s in SLUGS}
+    for i in range(files):
+        drive.add(f"{i:06d}_bench.pdf", folders[SECTION], _payload(i, size))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), None)
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(cert_path, key_path)
+    server.socket = ctx.wrap_socket(server.socket, server_side=True)
+    base = f"https://127.0.0.1:{server.server_address[1]}"
+    server.RequestHandlerClass = make_handler(drive, base)
+    port_out.send(server.server_address[1])
+    port_out.close()
+    server.serve_forever()
+
+
+class FakeDriveProcess:
+    """
+    الخادم الوهمي في عملية مستقلة: الملفات المبذورة والمرفوعة تبقى في ذاكرته،
+    فلا تدخل في ذروة RSS لعملية التطبيق المقاسة. العدادات تُقرأ عبر STATS_PATH.
+    """
+
+    def __init__(self, files: int, size: int, workdir: str):
+        self.pem, key_path, self.cert_path = make_key_and_cert(workdir)
+        # httplib2 يقرأ هذا المتغير عند استيراده؛ التطبيق لم يُستورد بعد في هذه العملية
+        os.environ["HTTPLIB2_CA_CERTS"] = self.cert_path
+        ctx = multiprocessing.get_context("spawn")
+        recv, send = ctx.Pipe(duplex=False)
+        self.proc = ctx.Process(
+            target=_serve_fake_drive, args=(files, size, key_path, self.cert_path, send),
+            name="fake-drive", daemon=True,
+        )
+        self.proc.start()
+        send.close()
+        self.base = f"https://127.0.0.1:{recv.recv()}"
+        self._ssl = ssl.create_default_context(cafile=self.cert_path)
+
+    def stats(self) -> dict:
+        with urlopen(self.base + STATS_PATH, context=self._ssl) as resp:
+            return json.loads(resp.read())
+
+    def totals(self) -> tuple:
+        s = self.stats()
+        return sum(s["calls"].values()), s["bytes_in"], s["bytes_out"]
+
+    def stop(self) -> None:
+        self.proc.terminate()
+        self.proc.join(5)
+
+
+def _payload(i: int, size: int) -> bytes:
+    head = f"%PDF-1.4\n% bench file {i}\n".encode()
+    return (head + b"\0" * size)[:size]
+
+
+def service_account_info(base: str, pem: str) -> dict:
+    return {
+        "type": "service_account",
+        "project_id": "bench",
+        "private_key_id": "bench",
+        "private_key": pem,
+        "client_email": "bench@bench.iam.gserviceaccount.com",
+        "client_id": "1",
+        "token_uri": f"{base}/token",
+    }
+
+
+# ================= السيناريوهات (داخل عملية فرعية) =================
+
+
+def _peak_rss_kb() -> int:
+    # عملية التطبيق وحدها: الخادم الوهمي عملية أخرى
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Bench:
+    def __init__(self, args, workdir: str):
+        from streamlit.testing.v1 import AppTest
+
+        self.args = args
+        self.drive: Optional[FakeDriveProcess] = None
+        secrets = {
+            PW_KEY: PASSWORD,
+            # عمال الخلفية معطلة افتراضيًا حتى تُنسب كل الطلبات إلى إعادة التشغيل المقاسة
+            "CONTENT_INDEX": "false",
+            "THUMBNAILS": "false",
+            "METRICS_EXPORT_SECONDS": "0",
+            "SEARCH_DB": os.path.join(workdir, "search.sqlite"),
+            "DOWNLOAD_CACHE_DIR": os.path.join(workdir, "downloads"),
+            "THUMB_CACHE_DIR": os.path.join(workdir, "thumbs"),
+        }
+        if args.backend == "drive":
+            self.drive = FakeDriveProcess(args.files, args.size, workdir)
+            base = self.drive.base
+            secrets.update({
+                "DRIVE_ROOT_FOLDER_ID": ROOT_ID,
+                "DRIVE_API_ENDPOINT": f"{base}/drive/v3/",
+                "google_service_account": service_account_info(base, self.drive.pem),
+            })
+        else:
+            root = os.path.join(workdir, "qms")
+            folder = os.path.join(root, SECTION)
+            os.makedirs(folder)
+            for i in range(args.files):
+                with open(os.path.join(folder, f"{i:06d}_bench.pdf"), "wb") as f:
+                    f.write(_payload(i, args.size))
+            secrets.update({"STORAGE_BACKEND": "local", "LOCAL_STORAGE_DIR": root})
+        for item in args.secret:
+            key, _, value = item.partition("=")
+            secrets[key] = value
+        self.at = AppTest.from_file(APP, default_timeout=args.timeout)
+        for k, v in secrets.items():
+            self.at.secrets[k] = v
+
+    def measure(self, action=None) -> dict:
+        """إعادة تشغيل واحدة (بعد action اختياري) مع الطلبات والبايتات التي سببتها."""
+        d = self.drive
+        before = d.totals() if d else (0, 0, 0)
+        t0 = time.perf_counter()
+        if action:
+            action()
+        self.at.run()
+        seconds = time.perf_counter() - t0
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+        after = d.totals() if d else (0, 0, 0)
+        return {
+            "seconds": round(seconds, 4),
+            "drive_calls": after[0] - before[0],
+            "upload_bytes": after[1] - before[1],
+            "download_bytes": after[2] - before[2],
+        }
+
+    def login(self) -> None:
+        self.at.text_input(key=f"pw_{SECTION}").set_value(PASSWORD)
+        self.measure(self.at.button(key=f"enter_{SECTION}").click)
+
+    # ---- السيناريوهات ----
+    def run_list(self) -> List[dict]:
+        return [self.measure() for _ in range(self.args.reruns)]
+
+    def run_download(self) -> List[dict]:
+        self.measure()
+        slug = SECTION
+        out = []
+        for i in range(1, min(self.args.reruns, self.args.files) + 1):
+            # "تجهيز للتنزيل" ثم إعادة التشغيل التي تبني زر التنزيل بمحتوى الملف
+            out.append(self.measure(self.at.button(key=f"prep_{slug}_{i}").click))
+        return out
+
+    def run_upload(self) -> List[dict]:
+        self.measure()
+        self.login()
+        slug = SECTION
+        out = []
+        for r in range(self.args.reruns):
+            batch = [
+                (f"upload_{r}_{j}.pdf", _payload(10_000_000 + r * 100 + j, self.args.size), "application/pdf")
+                for j in range(self.args.batch)
+            ]
+            self.at.file_uploader(key=f"uploader_{slug}_{r}").set_value(batch)
+            self.measure()
+            out.append(self.measure(self.at.button(key=f"upload_{slug}").click))
+        return out
+
+
+def _summary(runs: List[dict]) -> dict:
+    """الإعادة الأولى (باردة) منفصلة؛ النسب المئوية للإعادات التالية فقط."""
+    if not runs:
+        return {"runs": 0}
+    warm = sorted(r["seconds"] for r in runs[1:]) or [runs[0]["seconds"]]
+    return {
+        "runs": len(runs),
+        "first_seconds": runs[0]["seconds"],
+        "p50_seconds": quantile(warm, 0.5),
+        "p95_seconds": quantile(warm, 0.95),
+        "mean_drive_calls": round(statistics.mean(r["drive_calls"] for r in runs), 2),
+        "total_drive_calls": sum(r["drive_calls"] for r in runs),
+        "upload_bytes": sum(r["upload_bytes"] for r in runs),
+        "download_bytes": sum(r["download_bytes"] for r in runs),
+    }
+
+
+def run_child(args) -> dict:
+    workdir = tempfile.mkdtemp(prefix="ims-bench-")
+    bench = None
+    try:
+        bench = Bench(args, workdir)
+        runs = getattr(bench, f"run_{args.scenario}")()
+        by_op = bench.drive.stats()["calls"] if bench.drive else {}
+        return {
+            "scenario": args.scenario,
+            "backend": args.backend,
+            "files": args.files,
+            "file_bytes": args.size,
+            "secrets": args.secret,
+            "summary": _summary(runs),
+            "drive_calls_by_op": by_op,
+            "peak_rss_kb": _peak_rss_kb(),
+            "reruns": runs,
+        }
+    finally:
+        if bench is not None and bench.drive is not None:
+            bench.drive.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ================= التشغيل =================
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="IMS Streamlit benchmark (AppTest + fake Drive)")
+    p.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    p.add_argument("--backend", choices=("drive", "local"), default="drive")
+    p.add_argument("--files", type=int, default=200, help="files seeded into the section")
+    p.add_argument("--size", type=int, default=256 * 1024, help="bytes per seeded/uploaded file")
+    p.add_argument("--reruns", type=int, default=10, help="measured reruns per scenario")
+    p.add_argument("--batch", type=int, default=3, help="files per upload rerun")
+    p.add_argument("--timeout", type=float, default=120.0)
+    p.add_argument("--secret", action="append", default=[], metavar="KEY=VALUE",
+                   help="extra st.secrets entry, e.g. SYNC_LISTINGS=false")
+    p.add_argument("--out", help="append JSON lines here instead of stdout")
+    p.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    return p.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.child:
+        print(json.dumps(run_child(args), ensure_ascii=False))
+        return 0
+
+    # كل سيناريو في عملية مستقلة: ذروة RSS وذاكرات cache_resource لا تتسرب بينها
+    argv = list(argv if argv is not None else sys.argv[1:])
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    out = open(args.out, "a", encoding="utf-8") if args.out else sys.stdout
+    failed = 0
+    skip = None
+    if args.backend == "drive" and importlib.util.find_spec("cryptography") is None:
+        skip = "drive backend needs cryptography (pip install cryptography)"
+    try:
+        for scenario in scenarios:
+            if skip:
+                out.write(json.dumps({"scenario": scenario, "backend": args.backend, "skipped": skip}) + "\n")
+                continue
+            cmd = [sys.executable, os.path.abspath(__file__), *argv, "--scenario", scenario, "--child"]
+            proc = subprocess.run(cmd, capture_output=True, text=True, cwd=os.path.dirname(APP))
+            line = proc.stdout.strip().splitlines()[-1] if proc.returncode == 0 and proc.stdout.strip() else ""
+            if not line:
+                failed += 1
+                line = json.dumps({"scenario": scenario, "error": proc.stderr.strip()[-2000:]})
+            out.write(line + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+# ------------------------------------------------------------
+# IMS — قياس زمن طلبات Google Drive وعددها وحجمها وأخطائها
+# لكل عملية (list_files, save_upload, ...) ولكل قسم، مع تصدير بصيغة Prometheus
+# ------------------------------------------------------------
+
+import math
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Tuple
+
+QUANTILES = (0.5, 0.9, 0.99)
+
+Key = Tuple[str, str]  # (العملية، القسم)
+
+
+def quantile(sorted_vals: List[float], q: float) -> float:
+    """النسبة المئوية بطريقة أقرب رتبة."""
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, math.ceil(q * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class DriveMetrics:
+    """
+    عدادات تراكمية لكل (عملية، قسم) مع نافذة لآخر window زمنًا لحساب النسب المئوية.
+    آمنة للخيوط؛ تسجّل أيضًا كلفة إعادة التشغيل الحالية لخيط السكربت.
+    """
+
+    def __init__(self, window: int = 2000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._latency: Dict[Key, Deque[float]] = defaultdict(lambda: deque(maxlen=self._window))
+        self._calls: Dict[Key, int] = defaultdict(int)
+        self._errors: Dict[Key, int] = defaultdict(int)
+        self._bytes: Dict[Key, int] = defaultdict(int)
+        self._seconds: Dict[Key, float] = defaultdict(float)
+        self._run = threading.local()
+
+    def record(self, op: str, section: str, seconds: float, nbytes: int = 0, error: bool = False) -> None:
+        key = (op, section or "-")
+        with self._lock:
+            self._latency[key].append(seconds)
+            self._calls[key] += 1
+            self._seconds[key] += seconds
+            self._bytes[key] += nbytes
+            if error:
+                self._errors[key] += 1
+        run = getattr(self._run, "stats", None)
+        if run is not None:
+            run["calls"] += 1
+            run["seconds"] += seconds
+            run["bytes"] += nbytes
+
+    @contextmanager
+    def track(self, op: str, section: str = "") -> Iterator[dict]:
+        """with metrics.track("list_files", slug) as rec: ... rec["bytes"] = n"""
+        rec = {"bytes": 0}
+        t0 = time.perf_counter()
+        error = False
+        try:
+            yield rec
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(op, section, time.perf_counter() - t0, rec["bytes"], error)
+
+    def start_run(self) -> None:
+        """يبدأ عدّ طلبات إعادة التشغيل الحالية (في خيط السكربت)."""
+        self._run.stats = {"calls": 0, "seconds": 0.0, "bytes": 0}
+
+    def run_stats(self) -> dict:
+        return dict(getattr(self._run, "stats", None) or {"calls": 0, "seconds": 0.0, "bytes": 0})
+
+    def snapshot(self) -> List[dict]:
+        """صف لكل (عملية، قسم): العدد، الأخطاء، البايتات، الزمن الكلي والنسب المئوية."""
+        with self._lock:
+            keys = sorted(self._calls)
+            lat = {k: sorted(self._latency[k]) for k in keys}
+            out = []
+            for k in keys:
+                row = {
+                    "op": k[0],
+                    "section": k[1],
+                    "calls": self._calls[k],
+                    "errors": self._errors[k],
+                    "bytes": self._bytes[k],
+                    "seconds": round(self._seconds[k], 3),
+                }
+                for q in QUANTILES:
+                    row[f"p{int(q * 100)}_ms"] = round(quantile(lat[k], q) * 1000, 1)
+                out.append(row)
+        return out
+
+    def prometheus(self, prefix: str = "ims_drive") -> str:
+        """تصدير بصيغة Prometheus النصية (summary + counters)."""
+        with self._lock:
+            keys = sorted(self._calls)
+            lat = {k: sorted(self._latency[k]) for k in keys}
+            lines = [
+                f"# HELP {prefix}_request_seconds Google Drive API call latency.",
+                f"# TYPE {prefix}_request_seconds summary",
+            ]
+            for k in keys:
+                lbl = f'op="{_label(k[0])}",section="{_label(k[1])}"'
+                for q in QUANTILES:
+                    lines.append(f'{prefix}_request_seconds{{{lbl},quantile="{q}"}} {quantile(lat[k], q):.6f}')
+                lines.append(f"{prefix}_request_seconds_sum{{{lbl}}} {self._seconds[k]:.6f}")
+                lines.append(f"{prefix}_request_seconds_count{{{lbl}}} {self._calls[k]}")
+            for name, data, help_ in (
+                ("errors_total", self._errors, "Google Drive API calls that raised."),
+                ("bytes_total", self._bytes, "Bytes uploaded or downloaded through Google Drive."),
+            ):
+                lines.append(f"# HELP {prefix}_{name} {help_}")
+                lines.append(f"# TYPE {prefix}_{name} counter")
+                for k in keys:
+                    lbl = f'op="{_label(k[0])}",section="{_label(k[1])}"'
+                    lines.append(f"{prefix}_{name}{{{lbl}}} {data[k]}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """يكتب التصدير ذريًا إلى ملف (لـ textfile collector؛ الملف المؤقت .part لا يُقرأ)."""
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(tmp, path)
+
+    def start_export(self, path: str, interval: float) -> threading.Thread:
+        """خيط خلفي يعيد كتابة ملف التصدير كل interval ثانية."""
+
+        def loop() -> None:
+            while True:
+                try:
+                    self.write_prometheus(path)
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, name="ims-metrics-export", daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,148 @@
+# ------------------------------------------------------------
+# IMS — جدولة طلبات Google Drive ضمن حصة المشروع
+# دلو رموز (token bucket) مشترك، أولوية لطلبات الواجهة على الرفع والمزامنة،
+# وإعادة المحاولة بتراجع أسي عشوائي عند 429/403 rateLimitExceeded/5xx
+# ------------------------------------------------------------
+
+import heapq
+import itertools
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, Tuple, TypeVar
+
+INTERACTIVE = 0  # القوائم والتنزيل من جلسة مستخدم
+BULK = 1         # الرفع، المزامنة، الفهرسة
+
+T = TypeVar("T")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RATE_LIMIT_REASONS = (b"rateLimitExceeded", b"userRateLimitExceeded")
+
+
+def _status(exc: BaseException) -> Optional[int]:
+    resp = getattr(exc, "resp", None)
+    try:
+        return int(getattr(resp, "status", None))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """429، أو 403 بسبب تجاوز الحصة (وليس رفض الصلاحية)."""
+    status = _status(exc)
+    if status == 429:
+        return True
+    content = getattr(exc, "content", b"") or b""
+    return status == 403 and any(r in content for r in RATE_LIMIT_REASONS)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if is_rate_limited(exc) or _status(exc) in RETRY_STATUSES:
+        return True
+    return isinstance(exc, (socket.timeout, ConnectionError, TimeoutError))
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    resp = getattr(exc, "resp", None)
+    try:
+        return float(resp.get("retry-after"))  # type: ignore[union-attr]
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class DriveScheduler:
+    """
+    بوابة واحدة لكل طلبات Drive في العملية:
+    - دلو رموز بمعدل rate طلب/ثانية وسعة burst، فتتحول الذروات إلى انتظار في الطابور؛
+    - الطابور مرتب بالأولوية ثم بالوصول، فطلبات الواجهة تسبق الرفع والمزامنة؛
+    - الأخطاء المؤقتة تُعاد بتراجع أسي عشوائي (full jitter)، وأخطاء الحصة
+      تفرغ الدلو حتى تتباطأ بقية الطلبات أيضًا.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        burst: int,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 32.0,
+    ):
+        self.rate = max(rate, 0.001)
+        self.burst = max(1, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = float(self.burst)
+        self._stamp = time.monotonic()
+        self._cond = threading.Condition()
+        self._waiting: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._local = threading.local()
+
+    # ---- الأولوية لكل خيط ----
+    def thread_priority(self) -> int:
+        return getattr(self._local, "priority", INTERACTIVE)
+
+    def set_thread_priority(self, priority: int) -> None:
+        """تضبطها خيوط الخلفية (المزامنة، الفهرسة، عمال الرفع) على BULK."""
+        self._local.priority = priority
+
+    @contextmanager
+    def priority(self, priority: int) -> Iterator[None]:
+        prev = self.thread_priority()
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = prev
+
+    # ---- دلو الرموز ----
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self, priority: Optional[int] = None) -> None:
+        """ينتظر دوره في الطابور ثم رمزًا من الدلو."""
+        ticket = (self.thread_priority() if priority is None else priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                self._refill()
+                if self._waiting[0] == ticket and self._tokens >= 1:
+                    heapq.heappop(self._waiting)
+                    self._tokens -= 1
+                    self._cond.notify_all()
+                    return
+                wait = (1 - self._tokens) / self.rate if self._waiting[0] == ticket else None
+                self._cond.wait(timeout=wait)
+
+    def penalize(self) -> None:
+        """تجاوز الحصة: يفرغ الدلو فيتباطأ الجميع لا الطلب الفاشل وحده."""
+        with self._cond:
+            self._refill()
+            self._tokens = min(self._tokens, 0.0)
+
+    def backoff(self, attempt: int, exc: BaseException) -> float:
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        hint = _retry_after(exc)
+        return max(delay, hint) if hint else delay
+
+    def run(self, fn: Callable[[], T], priority: Optional[int] = None) -> T:
+        """ينفّذ fn ضمن الحصة، ويعيده عند الأخطاء المؤقتة حتى max_retries مرة."""
+        attempt = 0
+        while True:
+            self.acquire(priority)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                if is_rate_limited(e):
+                    self.penalize()
+                time.sleep(self.backoff(attempt, e))
+                attempt += 1
@@ -0,0 +1,116 @@
+# ------------------------------------------------------------
+# IMS — نسخ مُحسّنة من صور الواجهة (الشعار وشهادة ISO)
+# تُولَّد مرة واحدة بأحجام العرض الفعلية (WebP + JPEG/PNG احتياطي)، وتُسمّى
+# ببصمة المحتوى فيخدمها app_routes بتخزين دائم في المتصفح
+# ------------------------------------------------------------
+
+import hashlib
+import os
+import tempfile
+from html import escape
+from typing import List, NamedTuple, Sequence
+
+# -------- Optional image processing (Pillow يأتي عادة مع streamlit) --------
+try:
+    from PIL import Image
+    HAS_PIL = True
+except Exception:
+    Image = None
+    HAS_PIL = False
+
+
+class Variant(NamedTuple):
+    mime: str
+    width: int
+    height: int
+    name: str
+
+
+# صيغة -> (الامتداد، نوع MIME، إعدادات الحفظ)
+FORMATS = {
+    "webp": ("webp", "image/webp", {"quality": 80, "method": 6}),
+    "jpeg": ("jpg", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+    "png": ("png", "image/png", {"optimize": True}),
+}
+
+
+def content_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def _save(img, path: str, fmt: str) -> None:
+    folder = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+    os.close(fd)
+    try:
+        img.save(tmp, format=fmt.upper(), **FORMATS[fmt][2])
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_variants(
+    src: str, out_dir: str, widths: Sequence[int], formats: Sequence[str]
+) -> List[Variant]:
+    """
+    يولّد نسخة لكل (صيغة، عرض) دون تكبير الصورة الأصلية. الاسم يتضمن بصمة
+    المحتوى، فالملفات الموجودة مسبقًا تُستخدم كما هي ولا يُعاد توليدها.
+    """
+    if not HAS_PIL:
+        return []
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(src))[0]
+    digest = content_hash(src)
+    out: List[Variant] = []
+    with Image.open(src) as im:
+        im.load()
+        for w in sorted({min(w, im.width) for w in widths}):
+            h = max(1, round(im.height * w / im.width))
+            resized = None
+            for fmt in formats:
+                ext, mime, _ = FORMATS[fmt]
+                name = f"{stem}-{digest}-{w}.{ext}"
+                path = os.path.join(out_dir, name)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = im if w == im.width else im.resize((w, h), Image.LANCZOS)
+                    img = resized
+                    if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+                        img = img.convert("RGB")
+                    _save(img, path, fmt)
+                out.append(Variant(mime, w, h, name))
+    return out
+
+
+def picture_html(
+    variants: Sequence[Variant], url_prefix: str, css_class: str, alt: str, sizes: str
+) -> str:
+    """
+    عنصر <picture>: WebP للمتصفحات التي تدعمه، والصيغة الاحتياطية في <img>.
+    المتصفح يختار أصغر عرض يكفي شاشته من srcset.
+    """
+    def url(v: Variant) -> str:
+        return f"{url_prefix}/{v.name}"
+
+    by_mime = {}
+    for v in variants:
+        by_mime.setdefault(v.mime, []).append(v)
+    fallback = next(vs for m, vs in by_mime.items() if m != "image/webp")
+    largest = fallback[-1]
+
+    def srcset(vs: Sequence[Variant]) -> str:
+        return ", ".join(f"{url(v)} {v.width}w" for v in vs)
+
+    webp = by_mime.get("image/webp")
+    sources = f"<source type='image/webp' srcset='{srcset(webp)}' sizes='{sizes}'>" if webp else ""
+    return (
+        f"<picture>{sources}"
+        f"<img class='{css_class}' src='{url(largest)}' srcset='{srcset(fallback)}' sizes='{sizes}' "
+        f"width='{largest.width}' height='{largest.height}' alt='{escape(alt, quote=True)}' "
+        f"decoding='async'></picture>"
+    )
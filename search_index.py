@@ -0,0 +1,316 @@
+# ------------------------------------------------------------
+# IMS — فهرس البحث المحلي (SQLite FTS5) لملفات جميع الأقسام
+# يُغذّى من مسار القوائم/المزامنة في streamlit_app.py، ولا يتصل بـ Drive أبدًا
+# ------------------------------------------------------------
+
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import unicodedata
+from typing import Iterable, List, Tuple
+
+# -------- Optional PDF text extraction --------
+try:
+    from pypdf import PdfReader
+    HAS_PYPDF = True
+except Exception:
+    PdfReader = None
+    HAS_PYPDF = False
+
+# أقصى طول لنص ملف واحد في الفهرس (الملفات الضخمة تُفهرس بدايتها فقط)
+MAX_TEXT_CHARS = 2_000_000
+
+# رموز خروج "python search_index.py extract <path>"
+EXIT_BAD_FILE = 2  # ملف تالف أو ليس PDF: لا نص له
+EXIT_MISSING = 3  # حُذف الملف قبل قراءته
+
+# (الاسم، الحجم، file_id، الإصدار) — نفس صيغة صفوف list_files_page
+Row = Tuple[str, int, str, str]
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS files (
+        file_id TEXT PRIMARY KEY,
+        slug TEXT NOT NULL,
+        name TEXT NOT NULL,
+        size INTEGER,
+        ver TEXT,
+        terms TEXT
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_files_slug ON files(slug);",
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+        terms, content='files', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_ai AFTER INSERT ON files BEGIN
+        INSERT INTO files_fts(rowid, terms) VALUES (new.rowid, new.terms);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_ad AFTER DELETE ON files BEGIN
+        INSERT INTO files_fts(files_fts, rowid, terms) VALUES ('delete', old.rowid, old.terms);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS files_au AFTER UPDATE ON files BEGIN
+        INSERT INTO files_fts(files_fts, rowid, terms) VALUES ('delete', old.rowid, old.terms);
+        INSERT INTO files_fts(rowid, terms) VALUES (new.rowid, new.terms);
+    END;
+    """,
+    # نصوص ملفات PDF مفهرسة مرة واحدة لكل بصمة محتوى (ver = md5Checksum)
+    "CREATE INDEX IF NOT EXISTS idx_files_ver ON files(ver);",
+    """
+    CREATE TABLE IF NOT EXISTS texts (
+        ver TEXT PRIMARY KEY,
+        terms TEXT
+    );
+    """,
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS texts_fts USING fts5(
+        terms, content='texts', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS texts_ai AFTER INSERT ON texts BEGIN
+        INSERT INTO texts_fts(rowid, terms) VALUES (new.rowid, new.terms);
+    END;
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS texts_ad AFTER DELETE ON texts BEGIN
+        INSERT INTO texts_fts(texts_fts, rowid, terms) VALUES ('delete', old.rowid, old.terms);
+    END;
+    """,
+]
+
+_UPSERT_SQL = (
+    "INSERT INTO files(file_id, slug, name, size, ver, terms) VALUES (?,?,?,?,?,?) "
+    "ON CONFLICT(file_id) DO UPDATE SET slug=excluded.slug, name=excluded.name, "
+    "size=excluded.size, ver=excluded.ver, terms=excluded.terms"
+)
+
+_HARAKAT = re.compile("[\u0610-\u061a\u064b-\u065f\u0670\u0640]")
+_SPLIT = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_ar(text: str) -> str:
+    """
+    توحيد النص العربي للفهرسة والبحث: إزالة التشكيل والتطويل، وتوحيد
+    أشكال الألف والياء والتاء المربوطة، وإضافة صيغة كل كلمة بدون "ال".
+    """
+    # NFKC يحوّل أشكال العرض العربية (الشائعة في نصوص PDF) إلى الحروف الأساسية
+    text = _HARAKAT.sub("", unicodedata.normalize("NFKC", text or "")).lower()
+    text = re.sub("[أإآ]", "ا", text).replace("ى", "ي").replace("ة", "ه")
+    out = []
+    for tok in _SPLIT.split(text):
+        if not tok:
+            continue
+        out.append(tok)
+        if tok.startswith("ال") and len(tok) > 3:
+            out.append(tok[2:])
+    return " ".join(out)
+
+
+def extract_pdf_text(path: str) -> str:
+    """
+    يستخرج نص ملف PDF ويعيده بصيغة الفهرسة (normalize_ar).
+    يستدعيها التطبيق عبر extract_in_subprocess.
+    """
+    if not HAS_PYPDF:
+        return ""
+    reader = PdfReader(path)
+    parts: List[str] = []
+    total = 0
+    for page in reader.pages:
+        try:
+            text = page.extract_text() or ""
+        except Exception:  # صفحة تالفة أو مسح ضوئي بلا نص
+            continue
+        parts.append(text)
+        total += len(text)
+        if total >= MAX_TEXT_CHARS:
+            break
+    return normalize_ar("\n".join(parts)[:MAX_TEXT_CHARS])
+
+
+class ExtractCrashed(RuntimeError):
+    """انتهت عملية الاستخراج دون نتيجة (قُتلت، نفدت ذاكرتها، أو تجاوزت المهلة)."""
+
+
+def extract_in_subprocess(path: str, timeout: float) -> str:
+    """
+    extract_pdf_text في عملية Python جديدة تشغّل هذه الوحدة وحدها: لا تستورد
+    التطبيق (عمال multiprocessing يعيدون تنفيذ __main__، وهو سكربت Streamlit).
+    FileNotFoundError للملف المحذوف، ValueError للملف التالف، وExtractCrashed
+    لما عدا ذلك (قابل لإعادة المحاولة).
+    """
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "extract", os.path.abspath(path)],
+            capture_output=True,
+            timeout=timeout,
+        )
+    except subprocess.TimeoutExpired as e:
+        raise ExtractCrashed(f"timed out after {timeout:g}s") from e
+    if proc.returncode == 0:
+        return proc.stdout.decode("utf-8")
+    err = proc.stderr.decode("utf-8", "replace").strip().splitlines()
+    detail = err[-1] if err else f"exit code {proc.returncode}"
+    if proc.returncode == EXIT_MISSING:
+        raise FileNotFoundError(path)
+    if proc.returncode == EXIT_BAD_FILE:
+        raise ValueError(detail)
+    raise ExtractCrashed(detail)
+
+
+def fts_query(text: str) -> str:
+    """يحوّل نص المستخدم إلى استعلام FTS5 آمن: كل كلمة بادئة، وجميعها مطلوبة."""
+    toks = [t for t in normalize_ar(text).split() if t]
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in dict.fromkeys(toks))
+
+
+class SearchIndex:
+    """
+    فهرس أسماء وبيانات ملفات الأقسام. اتصال جديد لكل عملية قصيرة،
+    ووضع WAL حتى لا يحجب البحث كتابات المزامنة (ولا العكس).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        con = self._connect()
+        try:
+            con.execute("PRAGMA journal_mode=WAL")
+            for sql in SCHEMA_SQL:
+                con.execute(sql)
+            con.commit()
+        finally:
+            con.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=10)
+
+    @staticmethod
+    def _values(slug: str, rows: Iterable[Row]):
+        for name, size, fid, ver in rows:
+            if fid:
+                yield (fid, slug, name, int(size or 0), ver, normalize_ar(name))
+
+    def upsert(self, slug: str, rows: Iterable[Row]) -> None:
+        con = self._connect()
+        try:
+            with con:
+                con.executemany(_UPSERT_SQL, self._values(slug, rows))
+        finally:
+            con.close()
+
+    def replace_section(self, slug: str, rows: Iterable[Row]) -> None:
+        """يستبدل جميع ملفات القسم بقائمة كاملة جديدة في معاملة واحدة."""
+        con = self._connect()
+        try:
+            with con:
+                con.execute("DELETE FROM files WHERE slug=?", (slug,))
+                con.executemany(_UPSERT_SQL, self._values(slug, rows))
+        finally:
+            con.close()
+
+    def remove(self, file_id: str) -> None:
+        con = self._connect()
+        try:
+            with con:
+                con.execute("DELETE FROM files WHERE file_id=?", (file_id,))
+        finally:
+            con.close()
+
+    def search(self, text: str, limit: int = 50) -> List[Tuple[str, str, int, str, str]]:
+        """[(slug، الاسم، الحجم، file_id، الإصدار), ...] مرتبة حسب الصلة."""
+        q = fts_query(text)
+        if not q:
+            return []
+        con = self._connect()
+        try:
+            return con.execute(
+                "SELECT f.slug, f.name, f.size, f.file_id, f.ver "
+                "FROM files_fts JOIN files f ON f.rowid = files_fts.rowid "
+                "WHERE files_fts MATCH ? ORDER BY bm25(files_fts) LIMIT ?",
+                (q, limit),
+            ).fetchall()
+        finally:
+            con.close()
+
+    def pending_texts(self, limit: int = 20) -> List[Tuple[str, str, str, str, int]]:
+        """
+        ملفات PDF لم تُفهرس بصمة محتواها بعد: [(ver, file_id, slug, الاسم، الحجم), ...].
+        تغيّر محتوى الملف يغيّر ver، فيعود الملف إلى هذه القائمة تلقائيًا.
+        """
+        con = self._connect()
+        try:
+            return con.execute(
+                "SELECT f.ver, MIN(f.file_id), f.slug, f.name, MAX(f.size) FROM files f "
+                "LEFT JOIN texts t ON t.ver = f.ver "
+                "WHERE t.ver IS NULL AND f.ver <> '' AND lower(f.name) LIKE '%.pdf' "
+                "GROUP BY f.ver LIMIT ?",
+                (limit,),
+            ).fetchall()
+        finally:
+            con.close()
+
+    def store_text(self, ver: str, terms: str) -> None:
+        con = self._connect()
+        try:
+            with con:
+                con.execute("DELETE FROM texts WHERE ver=?", (ver,))
+                con.execute("INSERT INTO texts(ver, terms) VALUES (?,?)", (ver, terms))
+        finally:
+            con.close()
+
+    def prune_texts(self) -> None:
+        """يحذف نصوص البصمات التي لم يعد أي ملف يحملها."""
+        con = self._connect()
+        try:
+            with con:
+                con.execute("DELETE FROM texts WHERE ver NOT IN (SELECT ver FROM files)")
+        finally:
+            con.close()
+
+    def search_content(self, text: str, limit: int = 50) -> List[Tuple[str, str, int, str, str]]:
+        """مثل search لكن داخل نصوص ملفات PDF المفهرسة."""
+        q = fts_query(text)
+        if not q:
+            return []
+        con = self._connect()
+        try:
+            return con.execute(
+                "SELECT f.slug, f.name, f.size, f.file_id, f.ver "
+                "FROM texts_fts JOIN texts t ON t.rowid = texts_fts.rowid "
+                "JOIN files f ON f.ver = t.ver "
+                "WHERE texts_fts MATCH ? ORDER BY bm25(texts_fts) LIMIT ?",
+                (q, limit),
+            ).fetchall()
+        finally:
+            con.close()
+
+
+def main(argv: List[str]) -> int:
+    if len(argv) != 2 or argv[0] != "extract":
+        print("usage: python search_index.py extract <pdf>", file=sys.stderr)
+        return 64
+    try:
+        text = extract_pdf_text(argv[1])
+    except FileNotFoundError:
+        return EXIT_MISSING
+    except Exception as e:
+        print(f"{type(e).__name__}: {e}", file=sys.stderr)
+        return EXIT_BAD_FILE
+    sys.stdout.buffer.write(text.encode("utf-8"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
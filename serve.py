@@ -0,0 +1,14 @@
+# ------------------------------------------------------------
+# IMS — نقطة التشغيل: streamlit run serve.py   (أو uvicorn serve:app)
+# التطبيق نفسه streamlit_app.py، ومعه المسارات الإضافية من app_routes.py
+# ------------------------------------------------------------
+
+import os
+
+import streamlit as st
+
+from app_routes import ROUTES, ROUTES_ENV
+
+os.environ[ROUTES_ENV] = "1"
+
+app = st.App("streamlit_app.py", routes=ROUTES)
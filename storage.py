@@ -0,0 +1,268 @@
+# ------------------------------------------------------------
+# IMS — واجهة تخزين ملفات الأقسام
+# StorageBackend: حل مجلد القسم، القوائم، القراءة، الرفع، الحذف
+# LocalBackend: تخزين محلي بالكامل في qms/<slug> دون شبكة أو بيانات اعتماد
+# (تنفيذ Google Drive في streamlit_app.py فوق مجمّع الاتصالات والجدولة)
+# ------------------------------------------------------------
+
+import hashlib
+import os
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+# (الاسم، الحجم، file_id، الإصدار) — نفس صيغة صفوف list_files_page
+Row = Tuple[str, int, str, str]
+
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def content_digests(fh: BinaryIO, chunk: int = CHUNK_BYTES) -> Tuple[str, str]:
+    """
+    (SHA-256، MD5) للملف في قراءة واحدة دفعةً دفعة. MD5 هو md5Checksum الذي
+    يحفظه Drive لكل ملف، فيطابق حتى الملفات المرفوعة قبل appProperties.sha256.
+    """
+    sha, md5 = hashlib.sha256(), hashlib.md5()
+    fh.seek(0)
+    for block in iter(lambda: fh.read(chunk), b""):
+        sha.update(block)
+        md5.update(block)
+    fh.seek(0)
+    return sha.hexdigest(), md5.hexdigest()
+
+
+def sha256_stream(fh: BinaryIO, chunk: int = CHUNK_BYTES) -> str:
+    """
+    بصمة SHA-256 للملف (سداسية عشرية) بقراءته دفعةً دفعة. هي اسم ملفات
+    البصمات <sha256>.sha في uploads/ وفي .sha/ لدى LocalBackend، مع اختلاف
+    محتواها بين التخطيطين (انظر LocalBackend).
+    """
+    return content_digests(fh, chunk)[0]
+
+
+def upload_name(original: str) -> str:
+    """اسم الملف المرفوع: <HHMMSS-YYYYMMDD>_<اسم آمن><الامتداد>."""
+    stamp = datetime.now().strftime("%H%M%S-%Y%m%d")
+    base, ext = os.path.splitext(original or "file")
+    safe = "".join(ch if (ch.isalnum() or ch in ("_", "-", ".", " ")) else "_" for ch in base)
+    safe = "_".join(safe.split())
+    return f"{stamp}_{safe}{ext.lower()}"
+
+
+def slice_page(rows: List[Row], page_token: Optional[str], size: int) -> Tuple[List[Row], Optional[str]]:
+    """صفحة من قائمة محلية؛ رمز الصفحة هو الإزاحة داخل القائمة."""
+    start = int(page_token or 0)
+    end = start + size
+    return rows[start:end], (str(end) if end < len(rows) else None)
+
+
+class StorageBackend(ABC):
+    """
+    العمليات التي تحتاجها الواجهة من مخزن ملفات الأقسام.
+    put يعيد file_id أو رسالة خطأ تبدأ بـ __ERROR__ (مثل save_upload)، أو
+    "__EXISTS__:" + file_id إن كان المحتوى نفسه موجودًا في القسم فلم يُرفع.
+    """
+
+    @abstractmethod
+    def folder(self, slug: str) -> str:
+        """معرّف مجلد القسم (ينشئه إن لم يوجد)."""
+
+    @abstractmethod
+    def list_page(
+        self, slug: str, page_token: Optional[str], page_size: int
+    ) -> Tuple[List[Row], Optional[str]]:
+        """صفحة من ملفات القسم مرتبة تنازلياً بالاسم، ورمز الصفحة التالية أو None."""
+
+    @abstractmethod
+    def get(self, slug: str, name: str, file_id: str, version: str, dst: BinaryIO) -> None:
+        """ينسخ محتوى الملف إلى dst دفعةً دفعة."""
+
+    @abstractmethod
+    def put(
+        self,
+        slug: str,
+        up,
+        progress: Optional[Callable[[float], None]] = None,
+        known: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """يرفع الملف (أو يعيد __EXISTS__ لملف بنفس المحتوى في القسم).
+        known: نتيجة content_index لدفعة الرفع، أو None."""
+
+    @abstractmethod
+    def delete(self, slug: str, file_id: str, name: str) -> None:
+        """يحذف الملف وبصمته."""
+
+    def local_path(self, slug: str, name: str, file_id: str, version: str) -> Optional[str]:
+        """مسار الملف على القرص إن كان المخزن محليًا (للقراءة دون نسخ)، وإلا None."""
+        return None
+
+    def content_index(self, slug: str) -> Optional[Dict[str, str]]:
+        """
+        بصمات محتوى القسم (-> file_id) تُقرأ مرة واحدة لدفعة رفع وتُمرَّر إلى put،
+        أو None إن كان put يجد المكرر بنفسه دون تكلفة تُذكر.
+        """
+        return None
+
+
+class LocalBackend(StorageBackend):
+    """
+    الأقسام مجلدات تحت root (qms/<slug>)، وfile_id هو "<slug>/<الاسم>".
+    الإصدار من وقت التعديل والحجم، فيتغير مع كل تعديل للملف.
+    بصمات المحتوى لمنع تكرار الرفع في qms/<slug>/.sha/<sha256>.sha ومحتوى كل منها
+    اسم الملف. هذا تخطيط خاص بهذا المخزن ويختلف عن uploads/ (حيث <sha256>.sha بجانب
+    الملفات ومحتواه البصمة نفسها): حفظ الاسم يعيد file_id الموجود بقراءة ملف واحد،
+    والمجلد المخفي .sha لا يظهر في قوائم القسم.
+    الملفات الموجودة قبل هذا المخزن (أو المنسوخة يدويًا إلى qms/<slug>) بلا بصمة:
+    عند الرفع تُحسب بصمات الملفات التي تساوي حجم المرفوع فقط، وتُحفظ في .sha فلا
+    تُحسب مرة أخرى.
+    index (اختياري): فهرس البحث، يُحدَّث مع كل قائمة كاملة ورفع وحذف.
+    """
+
+    def __init__(self, root: str, index=None, chunk: int = CHUNK_BYTES):
+        self.root = root
+        self.index = index
+        self.chunk = chunk
+
+    def folder(self, slug: str) -> str:
+        path = os.path.join(self.root, slug)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _sha_dir(self, slug: str) -> str:
+        return os.path.join(self.folder(slug), ".sha")
+
+    @staticmethod
+    def _row(slug: str, name: str, info: os.stat_result) -> Row:
+        return (name, info.st_size, f"{slug}/{name}", f"{info.st_mtime_ns:x}-{info.st_size:x}")
+
+    def _rows(self, slug: str) -> List[Row]:
+        out: List[Row] = []
+        for entry in os.scandir(self.folder(slug)):
+            if entry.name.startswith(".") or entry.name.endswith(".part") or not entry.is_file():
+                continue
+            out.append(self._row(slug, entry.name, entry.stat()))
+        out.sort(key=lambda x: x[0], reverse=True)
+        return out
+
+    def list_page(
+        self, slug: str, page_token: Optional[str], page_size: int
+    ) -> Tuple[List[Row], Optional[str]]:
+        rows = self._rows(slug)
+        if self.index is not None and not page_token:
+            self.index.replace_section(slug, rows)
+        return slice_page(rows, page_token, page_size)
+
+    def _path(self, slug: str, name: str) -> str:
+        # os.path.basename: لا خروج من مجلد القسم مهما كان الاسم
+        return os.path.join(self.folder(slug), os.path.basename(name))
+
+    def get(self, slug: str, name: str, file_id: str, version: str, dst: BinaryIO) -> None:
+        with open(self._path(slug, name), "rb") as src:
+            shutil.copyfileobj(src, dst, self.chunk)
+
+    def local_path(self, slug: str, name: str, file_id: str, version: str) -> Optional[str]:
+        path = self._path(slug, name)
+        return path if os.path.exists(path) else None
+
+    def _remember(self, slug: str, sha: str, name: str) -> None:
+        os.makedirs(self._sha_dir(slug), exist_ok=True)
+        with open(os.path.join(self._sha_dir(slug), f"{sha}.sha"), "w", encoding="utf-8") as f:
+            f.write(name)
+
+    def _known(self, slug: str) -> dict:
+        """الاسم -> البصمة لكل ملف له بصمة في .sha."""
+        out = {}
+        sha_dir = self._sha_dir(slug)
+        if os.path.isdir(sha_dir):
+            for entry in os.scandir(sha_dir):
+                try:
+                    with open(entry.path, encoding="utf-8") as f:
+                        out[f.read().strip()] = entry.name[: -len(".sha")]
+                except FileNotFoundError:
+                    pass
+        return out
+
+    def _existing(self, slug: str, sha: str, size: int) -> Optional[str]:
+        try:
+            with open(os.path.join(self._sha_dir(slug), f"{sha}.sha"), encoding="utf-8") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            name = ""
+        if name and os.path.exists(self._path(slug, name)):
+            return name
+        # ملفات بلا بصمة بعد: يكفي حساب بصمات ما يساوي المرفوع حجمًا
+        known = self._known(slug)
+        for name, file_size, _, _ in self._rows(slug):
+            if file_size != size or known.get(name):
+                continue
+            with open(self._path(slug, name), "rb") as f:
+                digest = sha256_stream(f, self.chunk)
+            self._remember(slug, digest, name)
+            if digest == sha:
+                return name
+        return None
+
+    def put(
+        self,
+        slug: str,
+        up,
+        progress: Optional[Callable[[float], None]] = None,
+        known: Optional[Dict[str, str]] = None,
+    ) -> str:
+        try:
+            folder = self.folder(slug)
+            sha = sha256_stream(up, self.chunk)
+            up.seek(0, os.SEEK_END)
+            size = up.tell()
+            up.seek(0)
+            existing = self._existing(slug, sha, size)
+            if existing:
+                if progress:
+                    progress(1.0)
+                return f"__EXISTS__:{slug}/{existing}"
+
+            name = upload_name(getattr(up, "name", None) or "file")
+            total = max(1, getattr(up, "size", 0) or 0)
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    written = 0
+                    for block in iter(lambda: up.read(self.chunk), b""):
+                        out.write(block)
+                        written += len(block)
+                        if progress:
+                            progress(min(written / total, 1.0))
+                os.replace(tmp, os.path.join(folder, name))
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+
+            self._remember(slug, sha, name)
+            if self.index is not None:
+                self.index.upsert(slug, [self._row(slug, name, os.stat(os.path.join(folder, name)))])
+            if progress:
+                progress(1.0)
+            return f"{slug}/{name}"
+
+        except Exception as e:
+            return "__ERROR__:" + str(e)
+
+    def delete(self, slug: str, file_id: str, name: str) -> None:
+        os.remove(self._path(slug, name))
+        sha_dir = self._sha_dir(slug)
+        if os.path.isdir(sha_dir):
+            for entry in os.scandir(sha_dir):
+                try:
+                    with open(entry.path, encoding="utf-8") as f:
+                        stale = f.read().strip() == name
+                    if stale:
+                        os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        if self.index is not None:
+            self.index.remove(file_id)
@@ -7,17 +7,42 @@
 import os
 import io
 import base64
+import hashlib
+import json
+import queue
+import re
+import tempfile
+import secrets
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Tuple
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 
+import httplib2
 import streamlit as st
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp, Request as GoogleAuthRequest
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 
+from app_routes import EXPORT_DIR, EXPORT_URL, HERO_DIR, HERO_URL, routes_enabled
+from drive_metrics import DriveMetrics
+from drive_scheduler import BULK, DriveScheduler, is_retryable
+from hero_assets import HAS_PIL, build_variants, picture_html
+from search_index import HAS_PYPDF, ExtractCrashed, SearchIndex, extract_in_subprocess
+from storage import LocalBackend, StorageBackend, content_digests, slice_page, upload_name
+
 # ================= App setup =================
 st.set_page_config(page_title="IMS — Thi Qar Oil Company", layout="wide")
 
+# st.rerun في إصدارات Streamlit الحديثة، وexperimental_rerun في القديمة
+rerun = getattr(st, "rerun", None) or st.experimental_rerun
+
 # ================= Styling ===================
 st.markdown(
     """
@@ -28,7 +53,7 @@ st.markdown(
     display:grid;grid-template-columns:120px 1fr;gap:16px;
     align-items:center;justify-content:center;max-width:980px;margin:0 auto;
   }
-  .logo{width:110px}
+  .logo{width:110px;height:auto}
   .ttl {text-align:center}
   .ttl h1{margin:0;color:#123b57;font-size:44px;line-height:1.1;font-weight:800}
   .ttl h2{margin:10px 0 0;color:#b8860b;font-weight:800;font-size:34px}
@@ -42,6 +67,7 @@ st.markdown(
   .sig{ text-align:center; color:#a07605; font-weight:700; margin:10px 0 0;}
   .cert {max-width:980px;margin:12px auto 6px;border-radius:12px;overflow:hidden;
          border:1px solid #e6ebf2; background:#fff;}
+  .cert img{display:block;width:100%;height:auto}
   .cert-caption{max-width:980px;margin:4px auto 18px;text-align:center;color:#6b7280;font-size:13px}
 </style>
 """,
@@ -54,6 +80,26 @@ CERT_PATH = "iso_cert.jpg"   # ضع الصورة بهذا الاسم بجانب
 LOGO_PATH = "sold.png"       # شعار الشركة محليًا باسم sold.png
 
 
+@st.cache_resource
+def hero_picture(
+    path: str, mtime: float, widths: Tuple[int, ...], fallback: str, css_class: str, alt: str, sizes: str
+) -> str:
+    """
+    يولّد مرة واحدة لكل عملية (ولكل تعديل للملف عبر mtime) نسخًا بأحجام العرض
+    الفعلية بصيغة WebP وصيغة احتياطية، ويعيد عنصر <picture> يشير إليها.
+    النسخ تُخدم من مسار HERO_URL في app_routes بـ Cache-Control: immutable.
+    يعيد "" إن تعذّر ذلك (لا Pillow، لا يمكن الكتابة، أو التشغيل دون serve.py)
+    ليُستخدم العرض القديم.
+    """
+    if not (HAS_PIL and routes_enabled()):
+        return ""
+    try:
+        variants = build_variants(path, HERO_DIR, widths, ("webp", fallback))
+    except Exception:
+        return ""
+    return picture_html(variants, HERO_URL, css_class, alt, sizes) if variants else ""
+
+
 @st.cache_data
 def inline_logo_src(path: str = "sold.png") -> str:
     """
@@ -71,11 +117,18 @@ def inline_logo_src(path: str = "sold.png") -> str:
 st.markdown("<div class='hero-wrap'>", unsafe_allow_html=True)
 colA, colB, colC = st.columns([1, 3, 1])
 with colB:
-    logo_src = inline_logo_src(LOGO_PATH)
+    logo_html = ""
+    if os.path.exists(LOGO_PATH):
+        # 110px كما في .logo، و2x للشاشات عالية الكثافة
+        logo_html = hero_picture(
+            LOGO_PATH, os.path.getmtime(LOGO_PATH), (110, 220), "png", "logo", "logo", "110px"
+        )
+    if not logo_html:
+        logo_html = f"<img class='logo' src=\"{inline_logo_src(LOGO_PATH)}\">"
     st.markdown(
         f"""
         <div class='hero-grid'>
-          <img class='logo' src="{logo_src}">
+          {logo_html}
           <div class='ttl'>
             <h1>IMS — Integrated Management System</h1>
             <h2>شركة نفط ذي قار</h2>
@@ -105,7 +158,19 @@ st.markdown(
 )
 
 if os.path.exists(CERT_PATH):
-    st.image(CERT_PATH, use_column_width=True)
+    cert_html = hero_picture(
+        CERT_PATH,
+        os.path.getmtime(CERT_PATH),
+        (480, 980, 1960),
+        "jpeg",
+        "cert-img",
+        "ISO 9001:2015 certificate",
+        "(max-width: 980px) 100vw, 980px",
+    )
+    if cert_html:
+        st.markdown(f"<div class='cert'>{cert_html}</div>", unsafe_allow_html=True)
+    else:
+        st.image(CERT_PATH, use_column_width=True)
     st.markdown(
         "<div class='cert-caption'>نسخة من شهادة الاعتماد — Bureau Veritas — 2025</div>",
         unsafe_allow_html=True,
@@ -149,25 +214,293 @@ SECRET_KEYS = {
 
 # ================= Google Drive Setup =================
 
+# مخزن ملفات الأقسام: drive (الافتراضي) أو local (qms/<slug> على القرص، دون شبكة)
+STORAGE_BACKEND = str(st.secrets.get("STORAGE_BACKEND", "drive")).strip().lower()
+LOCAL_STORAGE_DIR = st.secrets.get("LOCAL_STORAGE_DIR", "qms")
+
 DRIVE_ROOT_FOLDER_ID = st.secrets.get("DRIVE_ROOT_FOLDER_ID", "").strip()
-if not DRIVE_ROOT_FOLDER_ID:
+if STORAGE_BACKEND == "drive" and not DRIVE_ROOT_FOLDER_ID:
     st.error("⚠️ لم يتم ضبط DRIVE_ROOT_FOLDER_ID في Secrets. يرجى إضافته.")
     st.stop()
 
 
 @st.cache_resource
-def get_drive_service():
-    """إنشاء اتصال واحد فقط بـ Google Drive."""
+def get_drive_credentials():
+    """بيانات اعتماد حساب الخدمة، مشتركة بين جميع الاتصالات."""
     sa_info = dict(st.secrets["google_service_account"])
-    creds = service_account.Credentials.from_service_account_info(
+    return service_account.Credentials.from_service_account_info(
         sa_info,
         scopes=["https://www.googleapis.com/auth/drive"],
     )
-    service = build("drive", "v3", credentials=creds)
+
+
+@st.cache_resource
+def get_drive_service():
+    """
+    كائن خدمة Drive واحد يُستخدم لبناء الطلبات فقط؛ التنفيذ يتم عبر
+    drive_execute() باتصال مستعار من مجمّع الاتصالات.
+    """
+    # DRIVE_API_ENDPOINT: خادم Drive بديل (مثل خادم القياس المحلي في bench_app.py)
+    endpoint = st.secrets.get("DRIVE_API_ENDPOINT", "")
+    service = build(
+        "drive",
+        "v3",
+        credentials=get_drive_credentials(),
+        client_options={"api_endpoint": endpoint} if endpoint else None,
+    )
     return service
 
 
-drive_service = get_drive_service()
+class DriveHttpPool:
+    """
+    مجمّع اتصالات HTTP مخوّلة بنفس بيانات اعتماد حساب الخدمة.
+    httplib2 غير آمن للخيوط، لذا يستعير كل طلب اتصالاً حصريًا ثم يعيده،
+    فتتوازى طلبات الجلسات المختلفة حتى size اتصالاً. تجديد الرمز مركزي
+    (تحت قفل واحد) بدل أن يجدده كل اتصال على حدة.
+    """
+
+    def __init__(self, creds, size: int):
+        self._creds = creds
+        self._idle: "queue.LifoQueue[AuthorizedHttp]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._refresh_lock = threading.Lock()
+
+    def _ensure_fresh(self) -> None:
+        if self._creds.valid:
+            return
+        with self._refresh_lock:
+            if not self._creds.valid:
+                self._creds.refresh(GoogleAuthRequest(httplib2.Http()))
+
+    @contextmanager
+    def http(self) -> Iterator[AuthorizedHttp]:
+        with self._slots:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = AuthorizedHttp(self._creds, http=httplib2.Http())
+            self._ensure_fresh()
+            try:
+                yield conn
+            finally:
+                self._idle.put(conn)
+
+
+@st.cache_resource
+def get_drive_pool() -> DriveHttpPool:
+    """مجمّع اتصالات واحد مشترك بين جميع الجلسات والخيوط."""
+    return DriveHttpPool(get_drive_credentials(), DRIVE_POOL_SIZE)
+
+
+def drive_http():
+    """يستعير اتصالاً من المجمّع: with drive_http() as http: ..."""
+    return get_drive_pool().http()
+
+
+@st.cache_resource
+def get_drive_metrics() -> DriveMetrics:
+    """قياسات طلبات Drive المشتركة بين الجلسات، مع تصدير Prometheus دوري إلى METRICS_FILE."""
+    metrics = DriveMetrics()
+    if METRICS_EXPORT_SECONDS > 0:
+        metrics.start_export(METRICS_FILE, METRICS_EXPORT_SECONDS)
+    return metrics
+
+
+@st.cache_resource
+def get_drive_scheduler() -> DriveScheduler:
+    """جدولة مشتركة لكل طلبات Drive في العملية ضمن حصة المشروع (DRIVE_QPS/DRIVE_BURST)."""
+    return DriveScheduler(DRIVE_QPS, DRIVE_BURST, max_retries=DRIVE_MAX_RETRIES)
+
+
+def drive_call(fn: Callable[[], object]):
+    """
+    يمرّر استدعاء Drive واحدًا عبر الجدولة: ينتظر دوره ورمزًا من الحصة،
+    ويُعاد تلقائيًا بتراجع أسي عند 429/rateLimitExceeded/5xx.
+    """
+    return get_drive_scheduler().run(fn)
+
+
+def drive_execute(request, op: str, section: str = ""):
+    """ينفّذ طلب Drive باتصال مستعار من المجمّع، ويسجّل زمن كل محاولة تحت (op, section)."""
+
+    def attempt():
+        with get_drive_metrics().track(op, section), drive_http() as http:
+            return request.execute(http=http)
+
+    return drive_call(attempt)
+
+
+drive_service = get_drive_service() if STORAGE_BACKEND == "drive" else None
+
+# lazy  = لا يُجلب محتوى الملف إلا عند طلب المستخدم تنزيله (الافتراضي)
+# eager = السلوك القديم: تجهيز زر التنزيل لكل ملف في القائمة مباشرة
+DOWNLOAD_MODE = str(st.secrets.get("DOWNLOAD_MODE", "lazy")).strip().lower()
+
+# فهرس محلي لقوائم الأقسام يُحدَّث من Changes API؛ بدلاً من files().list لكل إعادة تشغيل
+SYNC_LISTINGS = str(st.secrets.get("SYNC_LISTINGS", "true")).strip().lower() in ("1", "true", "yes")
+CHANGES_POLL_SECONDS = float(st.secrets.get("CHANGES_POLL_SECONDS", 30))
+
+# وضع المرآة: تُعرض الأقسام وتُخدم من qms/<slug> على القرص، ويزامنها خيط خلفي مع Drive
+MIRROR_MODE = str(st.secrets.get("MIRROR_MODE", "false")).strip().lower() in ("1", "true", "yes")
+MIRROR_DIR = st.secrets.get("MIRROR_DIR", "qms")
+MIRROR_SYNC_SECONDS = float(st.secrets.get("MIRROR_SYNC_SECONDS", 300))
+MANIFEST_NAME = ".manifest.json"
+
+# فهرس البحث المحلي (SQLite FTS5) لأسماء ملفات جميع الأقسام
+SEARCH_DB = st.secrets.get("SEARCH_DB", os.path.join(".cache", "search.sqlite"))
+
+# فهرسة نصوص ملفات PDF في الخلفية (تتطلب pypdf)، كل ملف في عملية Python مستقلة
+CONTENT_INDEX = str(st.secrets.get("CONTENT_INDEX", "true")).strip().lower() in ("1", "true", "yes")
+INDEX_WORKERS = max(1, int(st.secrets.get("INDEX_WORKERS", 2)))
+INDEX_POLL_SECONDS = float(st.secrets.get("INDEX_POLL_SECONDS", 60))
+# أكبر ملف PDF يُنزَّل للفهرسة (ميغابايت)، ومرات محاولة الملف قبل تسجيله دون نص
+INDEX_MAX_MB = int(st.secrets.get("INDEX_MAX_MB", 64))
+INDEX_ATTEMPTS = max(1, int(st.secrets.get("INDEX_ATTEMPTS", 3)))
+# مهلة استخراج نص ملف واحد (ثوانٍ)؛ تجاوزها يُعدّ عطلاً مؤقتًا
+INDEX_EXTRACT_TIMEOUT = float(st.secrets.get("INDEX_EXTRACT_TIMEOUT", 300))
+
+# صور معاينة مصغرة للملفات في القائمة (من صور Drive المصغرة) في ذاكرة قرص محدودة
+THUMBNAILS = str(st.secrets.get("THUMBNAILS", "true")).strip().lower() in ("1", "true", "yes")
+THUMB_PX = max(32, int(st.secrets.get("THUMB_PX", 96)))
+THUMB_CACHE_DIR = st.secrets.get("THUMB_CACHE_DIR", os.path.join(".cache", "thumbs"))
+THUMB_CACHE_MB = int(st.secrets.get("THUMB_CACHE_MB", 32))
+
+# ذاكرة التنزيل على القرص: المسار والحد الأقصى للحجم (ميغابايت)
+DOWNLOAD_CACHE_DIR = st.secrets.get("DOWNLOAD_CACHE_DIR", os.path.join(".cache", "downloads"))
+DOWNLOAD_CACHE_MB = int(st.secrets.get("DOWNLOAD_CACHE_MB", 512))
+
+# تصدير قسم كامل كملف ZIP يُكتب تدريجيًا في EXPORT_DIR ويُنزَّل عبر مسار app_routes (serve.py)
+EXPORT_TTL_SECONDS = float(st.secrets.get("EXPORT_TTL_SECONDS", 3600))
+
+# حجم دفعة التنزيل من Drive (ميغابايت)؛ يحدد أقصى ذاكرة للتنزيل المتدفق
+DOWNLOAD_CHUNK_MB = max(1, int(st.secrets.get("DOWNLOAD_CHUNK_MB", 8)))
+
+# حجم دفعة الرفع (ميغابايت؛ يجب أن يكون مضاعفًا لـ 256KB)
+UPLOAD_CHUNK_MB = max(1, int(st.secrets.get("UPLOAD_CHUNK_MB", 8)))
+
+# تصدير قياسات Drive بصيغة Prometheus إلى ملف خارج static/ (0 = تعطيل)، وكلمة مرور لوحة المراقبة.
+# الملف لا يُخدم عبر HTTP: يجمعه node_exporter (--collector.textfile.directory) من مجلده
+METRICS_EXPORT_SECONDS = float(st.secrets.get("METRICS_EXPORT_SECONDS", 15))
+METRICS_FILE = st.secrets.get("METRICS_FILE", os.path.join(".cache", "metrics", "ims_drive.prom"))
+ADMIN_PASSWORD = st.secrets.get("ADMIN_PASSWORD", "")
+
+# أقصى عدد من طلبات Drive المتزامنة (حجم مجمّع الاتصالات)
+DRIVE_POOL_SIZE = max(1, int(st.secrets.get("DRIVE_POOL_SIZE", 16)))
+
+# حصة طلبات Drive للعملية كلها (طلب/ثانية وسعة الذروة) وعدد محاولات الأخطاء المؤقتة
+DRIVE_QPS = float(st.secrets.get("DRIVE_QPS", 10))
+DRIVE_BURST = max(1, int(st.secrets.get("DRIVE_BURST", 20)))
+DRIVE_MAX_RETRIES = int(st.secrets.get("DRIVE_MAX_RETRIES", 6))
+
+# عدد الملفات التي تُرفع بالتوازي عند اختيار عدة ملفات
+UPLOAD_WORKERS = max(1, int(st.secrets.get("UPLOAD_WORKERS", 4)))
+
+# المخزن المحلي يقرأ القرص مباشرة: لا مرآة ولا فهرس Changes ولا معاينات من Drive
+if STORAGE_BACKEND == "local":
+    MIRROR_MODE = SYNC_LISTINGS = THUMBNAILS = False
+
+# مدة صلاحية قوائم الأقسام المخزنة والمشتركة بين الجلسات (عند SYNC_LISTINGS=false)
+LISTING_TTL_SECONDS = float(st.secrets.get("LISTING_TTL_SECONDS", 600))
+
+# عدد الملفات المعروضة في الصفحة الواحدة، والحد الأقصى الذي يسمح به Drive لكل طلب
+PAGE_SIZE = int(st.secrets.get("PAGE_SIZE", 25))
+DRIVE_LIST_MAX = 1000
+
+
+class DiskCache:
+    """
+    مخزن ملفات على القرص مفهرس بمفتاح المحتوى (file_id + checksum).
+    الكتابة ذرّية (ملف مؤقت ثم os.replace) لذا يمكن لعدة جلسات أو عمليات
+    مشاركته، وعند تجاوز الحد الأقصى تُحذف الملفات الأقدم استخدامًا (LRU).
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(key.encode("utf-8")).hexdigest())
+
+    def get_path(self, key: str) -> Optional[str]:
+        """يعيد مسار الملف المخزَّن إن وجد، ويحدّث وقت استخدامه لأغراض LRU."""
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:  # أزالته عملية أخرى للتو
+            return None
+
+    def put_stream(self, key: str, write: Callable[[BinaryIO], None]) -> str:
+        """يكتب المحتوى عبر write(fh) إلى ملف مؤقت ثم ينقله ذريًا إلى مكانه."""
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                write(fh)
+            path = self._path(key)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        يحذف الأقدم استخدامًا حتى يعود الحجم تحت الحد. keep (الملف المكتوب للتو)
+        لا يُحذف أبدًا، حتى لو كان وحده أكبر من الحد: المستدعي سيفتحه مباشرة،
+        ويُزال مع أول كتابة تالية.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.root):
+                if entry.name.endswith(".part") or not entry.is_file():
+                    continue
+                try:
+                    info = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((info.st_mtime, info.st_size, entry.path))
+                total += info.st_size
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                if path == keep:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_bytes:
+                    break
+
+
+@st.cache_resource
+def get_download_cache() -> DiskCache:
+    """ذاكرة تنزيل واحدة مشتركة بين جميع الجلسات."""
+    return DiskCache(DOWNLOAD_CACHE_DIR, DOWNLOAD_CACHE_MB * 1024 * 1024)
+
+
+@st.cache_resource
+def get_search_index() -> SearchIndex:
+    """فهرس بحث واحد مشترك؛ يُغذّى كلما قُرئت قائمة قسم من Drive."""
+    return SearchIndex(SEARCH_DB)
 
 
 @st.cache_data
@@ -183,128 +516,1060 @@ def auth_key(slug: str) -> str:
     return f"auth_{slug}"
 
 
-# حفظ ID مجلدات الأقسام في الذاكرة
-if "section_folders" not in st.session_state:
-    st.session_state["section_folders"] = {}
+def dl_key(slug: str) -> str:
+    """مفتاح session_state للملف المطلوب تنزيله حاليًا في القسم."""
+    return f"dl_ready_{slug}"
 
 
-def ensure_section_folder(slug: str) -> str:
+def page_key(slug: str) -> str:
+    """مفتاح session_state لحالة التصفح: رموز الصفحات التي زارها المستخدم ورقم الصفحة الحالية."""
+    return f"pages_{slug}"
+
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+@st.cache_resource
+def section_folder_map() -> Dict[str, str]:
     """
-    يتحقق من وجود مجلد داخل IMS-Storage للقسم، وإن لم يوجد ينشئه.
-    اسم المجلد هو نفس slug (policies, objectives, ...).
+    يحل مجلدات جميع الأقسام مرة واحدة لكل عملية (مشتركة بين كل الجلسات):
+    استعلام واحد عن المجلدات داخل IMS-Storage، ثم إنشاء المفقود منها
+    في طلب batch واحد. اسم المجلد هو نفس slug (policies, objectives, ...).
     """
-    cache = st.session_state["section_folders"]
-    if slug in cache:
-        return cache[slug]
-
-    # البحث عن المجلد بالاسم داخل الجذر
     q = (
         f"'{DRIVE_ROOT_FOLDER_ID}' in parents and "
-        f"name = '{slug}' and mimeType = 'application/vnd.google-apps.folder' "
-        f"and trashed = false"
-    )
-    res = (
-        drive_service.files()
-        .list(q=q, fields="files(id,name)", spaces="drive")
-        .execute()
+        f"mimeType = '{FOLDER_MIME}' and trashed = false"
     )
-    files = res.get("files", [])
-    if files:
-        folder_id = files[0]["id"]
-    else:
-        # إنشاء مجلد جديد
-        meta = {
-            "name": slug,
-            "mimeType": "application/vnd.google-apps.folder",
-            "parents": [DRIVE_ROOT_FOLDER_ID],
-        }
-        folder = drive_service.files().create(body=meta, fields="id").execute()
-        folder_id = folder["id"]
+    found: Dict[str, str] = {}
+    token = None
+    while True:
+        res = drive_execute(
+            drive_service.files().list(
+                q=q,
+                fields="nextPageToken, files(id,name)",
+                spaces="drive",
+                pageSize=DRIVE_LIST_MAX,
+                pageToken=token,
+            ),
+            "ensure_section_folder",
+        )
+        for f in res.get("files", []):
+            found.setdefault(f["name"], f["id"])
+        token = res.get("nextPageToken")
+        if not token:
+            break
+
+    slugs = list(SECTIONS_AR2EN.values())
+    folders = {s: found[s] for s in slugs if s in found}
+    missing = [s for s in slugs if s not in folders]
+    if missing:
+        def on_created(request_id, response, exception):
+            if exception is None:
+                folders[request_id] = response["id"]
+
+        def run_batch():
+            # يُبنى الطلب في كل محاولة لإرسال المجلدات التي لم تُنشأ بعد فقط
+            batch = drive_service.new_batch_http_request(callback=on_created)
+            for s in missing:
+                if s not in folders:
+                    meta = {"name": s, "mimeType": FOLDER_MIME, "parents": [DRIVE_ROOT_FOLDER_ID]}
+                    batch.add(drive_service.files().create(body=meta, fields="id"), request_id=s)
+            with get_drive_metrics().track("ensure_section_folder"), drive_http() as http:
+                batch.execute(http=http)
+
+        # الطلبات الفرعية الفاشلة تُترك لإعادة البناء التالية (ensure_section_folder)
+        drive_call(run_batch)
+    return folders
+
+
+def invalidate_section_folders() -> None:
+    """يفرغ خريطة المجلدات لتُعاد قراءتها من Drive عند أول طلب تالٍ."""
+    section_folder_map.clear()
+
 
-    cache[slug] = folder_id
-    return folder_id
+def ensure_section_folder(slug: str) -> str:
+    """يعيد ID مجلد القسم من الخريطة المشتركة، ويعيد بناءها مرة واحدة إن لم يوجد فيها."""
+    folders = section_folder_map()
+    if slug not in folders:
+        invalidate_section_folders()
+        folders = section_folder_map()
+    if slug not in folders:
+        raise RuntimeError(f"تعذّر إيجاد أو إنشاء مجلد القسم: {slug}")
+    return folders[slug]
+
+
+FILE_FIELDS = "id, name, size, md5Checksum, modifiedTime, parents, trashed, appProperties"
+
+
+def _file_row(f: dict) -> Tuple[str, int, str, str]:
+    """(الاسم، الحجم، file_id، الإصدار) من بيانات ملف Drive."""
+    ver = f.get("md5Checksum") or f.get("modifiedTime", "")
+    return (f.get("name", "file"), int(f.get("size", 0)), f.get("id"), ver)
+
+
+class ListingCache:
+    """
+    صفحات قوائم الأقسام من files().list مشتركة بين جميع الجلسات لمدة ttl ثانية.
+    الكتابة عبر التطبيق (save_upload / delete_file) تفرغ صفحات القسم فورًا،
+    فيرى صاحب التغيير نتيجته مباشرة.
+    تتابع أيضًا المرور على صفحات كل قسم بالترتيب، فعند جلب آخر صفحة بعد
+    سابقاتها تُعرف قائمة القسم كاملة ويُستبدل بها القسم في فهرس البحث.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._pages: Dict[str, Dict[Tuple[Optional[str], int], tuple]] = {}
+        self._walks: Dict[Tuple[str, int], tuple] = {}
+        self._lock = threading.Lock()
 
+    def get(self, slug: str, token: Optional[str], size: int):
+        with self._lock:
+            hit = self._pages.get(slug, {}).get((token, size))
+        if hit is None or hit[0] < time.monotonic():
+            return None
+        return hit[1], hit[2]
 
-def list_files(slug: str) -> List[Tuple[str, int, str]]:
+    def put(self, slug: str, token: Optional[str], size: int, rows: list, next_token: Optional[str]) -> None:
+        with self._lock:
+            self._pages.setdefault(slug, {})[(token, size)] = (
+                time.monotonic() + self.ttl, rows, next_token
+            )
+
+    def walk(
+        self, slug: str, token: Optional[str], size: int, rows: list, next_token: Optional[str]
+    ) -> Optional[list]:
+        """
+        يضيف صفحة مجلوبة إلى المرور الجاري على القسم. يعيد القائمة الكاملة
+        عند وصول آخر صفحة في سلسلة متصلة تبدأ من الصفحة الأولى، وإلا None.
+        """
+        key = (slug, size)
+        with self._lock:
+            if token is None:
+                acc: list = []
+            else:
+                walk = self._walks.get(key)
+                if walk is None or walk[0] != token:
+                    return None
+                acc = walk[1]
+            acc = acc + rows
+            if next_token:
+                self._walks[key] = (next_token, acc)
+                return None
+            self._walks.pop(key, None)
+            return acc
+
+    def invalidate(self, slug: str) -> None:
+        with self._lock:
+            self._pages.pop(slug, None)
+            # مرور بدأ قبل التغيير لم يعد يمثل محتوى القسم
+            for key in [k for k in self._walks if k[0] == slug]:
+                del self._walks[key]
+
+
+@st.cache_resource
+def get_listing_cache() -> ListingCache:
+    return ListingCache(LISTING_TTL_SECONDS)
+
+
+class ListingIndex:
     """
-    يرجع قائمة ملفات القسم من Google Drive:
-    (الاسم، الحجم، file_id)
+    فهرس محلي لبيانات ملفات جميع مجلدات الأقسام.
+    يُبنى مرة واحدة باستعلام واحد، ثم يبقى محدثًا من Changes API انطلاقًا
+    من آخر رمز صفحة مخزّن، فيطبّق التغييرات منذ آخر استطلاع فقط.
     """
-    folder_id = ensure_section_folder(slug)
 
-    q = f"'{folder_id}' in parents and trashed = false"
-    res = (
-        drive_service.files()
-        .list(
-            q=q,
-            fields="files(id, name, size, modifiedTime)",
-            orderBy="name desc",
+    def __init__(self, folders: Dict[str, str], poll_seconds: float):
+        self.folders = dict(folders)
+        self.poll_seconds = poll_seconds
+        self.files: Dict[str, Dict[str, dict]] = {s: {} for s in folders}
+        self._slug_of = {fid: s for s, fid in folders.items()}
+        self._token: Optional[str] = None
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+
+    def _bootstrap(self) -> None:
+        # رمز البداية يُطلب قبل القائمة الكاملة حتى لا يضيع أي تغيير يحدث أثناءها
+        token = drive_execute(
+            drive_service.changes().getStartPageToken(), "sync_changes"
+        )["startPageToken"]
+        parents = " or ".join(f"'{fid}' in parents" for fid in self.folders.values())
+        q = f"({parents}) and trashed = false"
+        page = None
+        while True:
+            res = drive_execute(
+                drive_service.files().list(
+                    q=q,
+                    fields=f"nextPageToken, files({FILE_FIELDS})",
+                    pageSize=DRIVE_LIST_MAX,
+                    pageToken=page,
+                ),
+                "list_files",
+                "*",
+            )
+            for f in res.get("files", []):
+                self._store(f)
+            page = res.get("nextPageToken")
+            if not page:
+                break
+        self._token = token
+        search = get_search_index()
+        for s, entries in self.files.items():
+            search.replace_section(s, [_file_row(f) for f in entries.values()])
+
+    def _store(self, f: dict) -> List[str]:
+        slugs = []
+        for parent in f.get("parents", []):
+            s = self._slug_of.get(parent)
+            if s:
+                self.files[s][f["id"]] = f
+                slugs.append(s)
+        return slugs
+
+    def _apply(self, change: dict) -> None:
+        fid = change.get("fileId")
+        search = get_search_index()
+        for entries in self.files.values():
+            if entries.pop(fid, None) is not None:
+                search.remove(fid)
+        f = change.get("file")
+        if change.get("removed") or not f or f.get("trashed"):
+            return
+        for s in self._store(f):
+            search.upsert(s, [_file_row(f)])
+
+    def poll(self, force: bool = False) -> None:
+        """يطبّق التغييرات منذ آخر استطلاع إن مرّت poll_seconds (أو فورًا مع force)."""
+        with self._lock:
+            if self._token is None:
+                self._bootstrap()
+                self._last_poll = time.monotonic()
+                return
+            if not force and time.monotonic() - self._last_poll < self.poll_seconds:
+                return
+            while True:
+                res = drive_execute(
+                    drive_service.changes().list(
+                        pageToken=self._token,
+                        spaces="drive",
+                        pageSize=DRIVE_LIST_MAX,
+                        fields=(
+                            "nextPageToken, newStartPageToken, "
+                            f"changes(fileId, removed, file({FILE_FIELDS}))"
+                        ),
+                    ),
+                    "sync_changes",
+                )
+                for change in res.get("changes", []):
+                    self._apply(change)
+                if "newStartPageToken" in res:
+                    self._token = res["newStartPageToken"]
+                    break
+                self._token = res["nextPageToken"]
+            self._last_poll = time.monotonic()
+
+    def note_created(self, f: dict) -> None:
+        """كتابة مباشرة بعد رفع ملف (f بحقول FILE_FIELDS) دون انتظار الاستطلاع التالي."""
+        with self._lock:
+            if self._token is not None:
+                self._apply({"fileId": f["id"], "file": f})
+
+    def note_deleted(self, file_id: str) -> None:
+        with self._lock:
+            if self._token is not None:
+                self._apply({"fileId": file_id, "removed": True})
+
+    def find_content(self, slug: str, sha: str, md5: str) -> Optional[str]:
+        """يعيد file_id لملف في القسم يحمل نفس المحتوى إن وجد."""
+        self.poll()
+        with self._lock:
+            for fid, f in self.files.get(slug, {}).items():
+                if _same_content(f, sha, md5):
+                    return fid
+        return None
+
+    def rows(self, slug: str) -> List[Tuple[str, int, str, str]]:
+        """قائمة ملفات القسم من الفهرس المحلي، مرتبة تنازلياً بالاسم."""
+        self.poll()
+        with self._lock:
+            entries = list(self.files.get(slug, {}).values())
+        out = [_file_row(f) for f in entries]
+        out.sort(key=lambda x: x[0], reverse=True)
+        return out
+
+
+@st.cache_resource
+def _listing_index(folders: Tuple[Tuple[str, str], ...]) -> ListingIndex:
+    return ListingIndex(dict(folders), CHANGES_POLL_SECONDS)
+
+
+def listing_index() -> ListingIndex:
+    """الفهرس المشترك بين الجلسات، ويُعاد بناؤه إذا تغيّرت خريطة المجلدات."""
+    return _listing_index(tuple(sorted(section_folder_map().items())))
+
+
+def list_files_page(
+    slug: str, page_token: Optional[str] = None, page_size: Optional[int] = None
+) -> Tuple[List[Tuple[str, int, str, str]], Optional[str]]:
+    """
+    يرجع صفحة واحدة من ملفات القسم:
+    ([(الاسم، الحجم، file_id، الإصدار), ...], رمز الصفحة التالية أو None)
+    الإصدار هو md5Checksum (أو modifiedTime لملفات Google) ويُستخدم مفتاحًا لذاكرة التنزيل.
+    في وضع المرآة (MIRROR_MODE) تُقرأ القائمة من qms/<slug> على القرص دون Drive.
+    """
+    size = page_size or PAGE_SIZE
+    if MIRROR_MODE:
+        return slice_page(mirror_rows(slug), page_token, size)
+    return get_storage().list_page(slug, page_token, size)
+
+
+def remote_files_page(
+    slug: str, page_token: Optional[str] = None, page_size: Optional[int] = None
+) -> Tuple[List[Tuple[str, int, str, str]], Optional[str]]:
+    """
+    صفحة من ملفات القسم كما هي على Google Drive.
+    مع SYNC_LISTINGS تُقرأ الصفحة من الفهرس المحلي ويكون الرمز إزاحة داخله،
+    وإلا تُطلب من Drive برمز صفحة Drive.
+    """
+    size = page_size or PAGE_SIZE
+    if SYNC_LISTINGS:
+        return slice_page(listing_index().rows(slug), page_token, size)
+    cache = get_listing_cache()
+    hit = cache.get(slug, page_token, size)
+    if hit is not None:
+        return hit
+
+    def fetch():
+        q = f"'{ensure_section_folder(slug)}' in parents and trashed = false"
+        return drive_execute(
+            drive_service.files().list(
+                q=q,
+                fields="nextPageToken, files(id, name, size, md5Checksum, modifiedTime)",
+                orderBy="name desc",
+                pageSize=size,
+                pageToken=page_token,
+            ),
+            "list_files",
+            slug,
         )
-        .execute()
-    )
-    items = res.get("files", [])
-    out: List[Tuple[str, int, str]] = []
-    for f in items:
-        name = f.get("name", "file")
-        size = int(f.get("size", 0))
-        fid = f.get("id")
-        out.append((name, size, fid))
-    # مرتبة تنازلياً بالاسم (مثل السابق)
-    out.sort(key=lambda x: x[0], reverse=True)
-    return out
+
+    try:
+        res = fetch()
+    except HttpError as e:
+        # مجلد محذوف أو منقول: أعد حل المجلدات وحاول مرة أخرى
+        if e.resp.status != 404:
+            raise
+        invalidate_section_folders()
+        res = fetch()
+    rows = [_file_row(f) for f in res.get("files", [])]
+    next_token = res.get("nextPageToken")
+    full = cache.walk(slug, page_token, size, rows, next_token)
+    if full is not None:
+        # قائمة كاملة: تُزال من الفهرس الملفات المحذوفة أو المعاد تسميتها في Drive
+        get_search_index().replace_section(slug, full)
+    else:
+        get_search_index().upsert(slug, rows)
+    cache.put(slug, page_token, size, rows, next_token)
+    return rows, next_token
+
+
+def _iter_pages(page_fn, slug: str) -> Iterator[Tuple[str, int, str, str]]:
+    token = None
+    while True:
+        rows, token = page_fn(slug, token, DRIVE_LIST_MAX)
+        yield from rows
+        if not token:
+            break
+
+
+def list_files(slug: str) -> Iterator[Tuple[str, int, str, str]]:
+    """
+    يمرّ على جميع ملفات القسم صفحةً صفحة (مرتبة تنازلياً بالاسم)
+    دون تحميل القائمة كاملة في الذاكرة.
+    """
+    return _iter_pages(list_files_page, slug)
+
+
+def list_remote_files(slug: str) -> Iterator[Tuple[str, int, str, str]]:
+    """مثل list_files لكن من Google Drive دائمًا (تستخدمه مزامنة المرآة)."""
+    return _iter_pages(remote_files_page, slug)
+
+
+def download_file_content(file_id: str, version: Optional[str] = None, slug: str = "") -> bytes:
+    """
+    تحميل محتوى ملف من Google Drive لاستخدامه في download_button.
+    إذا عُرف إصدار الملف يُخدم من ذاكرة القرص دون أي طلب إلى Drive،
+    وعند عدم وجوده يُنزَّل إلى ملف مؤقت على القرص ثم يُنقل ذريًا إلى الذاكرة.
+    بدون إصدار يُنزَّل الملف مباشرة دون تخزين.
+    """
+    if not version:
+        fh = io.BytesIO()
+        _download_to(file_id, fh, slug)
+        return fh.getvalue()
+
+    cache = get_download_cache()
+    key = f"{file_id}:{version}"
+    content = cache.get(key)
+    if content is not None:
+        return content
+    path = cache.put_stream(key, lambda fh: _download_to(file_id, fh, slug))
+    with open(path, "rb") as f:
+        return f.read()
 
 
-def download_file_content(file_id: str) -> bytes:
-    """تحميل محتوى ملف من Google Drive لاستخدامه في download_button."""
+def _download_to(file_id: str, fh: BinaryIO, slug: str = "") -> None:
     request = drive_service.files().get_media(fileId=file_id)
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        _, done = downloader.next_chunk()
-    fh.seek(0)
-    return fh.read()
+    with get_drive_metrics().track("download_file_content", slug) as rec, drive_http() as http:
+        request.http = http
+        downloader = MediaIoBaseDownload(fh, request, chunksize=DOWNLOAD_CHUNK_MB * 1024 * 1024)
+        done = False
+        while not done:
+            status, done = drive_call(downloader.next_chunk)
+            rec["bytes"] = status.resumable_progress
+
+
+def _same_content(f: dict, sha: str, md5: str) -> bool:
+    # md5Checksum يحفظه Drive لكل ملف ثنائي؛ appProperties.sha256 للملفات المرفوعة من التطبيق فقط
+    return f.get("md5Checksum") == md5 or (f.get("appProperties") or {}).get("sha256") == sha
+
+
+def section_digests(slug: str) -> Dict[str, str]:
+    """
+    بصمات محتوى القسم: md5Checksum وappProperties.sha256 -> file_id.
+    لا يمكن البحث بـ md5Checksum في استعلام Drive، لذا تُقرأ قائمة المجلد كاملة
+    (حقول البصمة فقط)؛ upload_many يقرأها مرة واحدة لكل دفعة رفع.
+    """
+    q = f"'{ensure_section_folder(slug)}' in parents and trashed = false"
+    out: Dict[str, str] = {}
+    token = None
+    while True:
+        res = drive_execute(
+            drive_service.files().list(
+                q=q,
+                fields="nextPageToken, files(id, md5Checksum, appProperties)",
+                pageSize=DRIVE_LIST_MAX,
+                pageToken=token,
+            ),
+            "find_duplicate",
+            slug,
+        )
+        for f in res.get("files", []):
+            for digest in (f.get("md5Checksum"), (f.get("appProperties") or {}).get("sha256")):
+                if digest:
+                    out.setdefault(digest, f["id"])
+        token = res.get("nextPageToken")
+        if not token:
+            return out
+
+
+def find_existing_upload(
+    slug: str, sha: str, md5: str, known: Optional[Dict[str, str]] = None
+) -> Optional[str]:
+    """
+    يبحث في القسم عن ملف بنفس المحتوى ويعيد file_id الخاص به أو None.
+    known: بصمات القسم من section_digests إن قُرئت مسبقًا لدفعة الرفع.
+    """
+    if SYNC_LISTINGS:
+        return listing_index().find_content(slug, sha, md5)
+    if known is None:
+        known = section_digests(slug)
+    return known.get(md5) or known.get(sha)
 
 
-def save_upload(slug: str, up) -> str:
+def save_upload(
+    slug: str,
+    up,
+    progress: Optional[Callable[[float], None]] = None,
+    known: Optional[Dict[str, str]] = None,
+) -> str:
     """
-    رفع ملف جديد إلى مجلد القسم في Google Drive.
+    رفع ملف جديد إلى مجلد القسم في Google Drive عبر جلسة رفع قابلة للاستئناف.
+    يُقرأ الملف من مصدره دفعةً دفعة (UPLOAD_CHUNK_MB) دون نسخه في الذاكرة،
+    وتُعاد الدفعة الفاشلة فقط عند الأعطال المؤقتة بدل إعادة الرفع من البداية.
+    إذا كان المحتوى نفسه موجودًا في القسم لا يُرفع مجددًا ويُعاد "__EXISTS__:" + file_id الموجود.
     يعيد file_id أو رسالة خطأ تبدأ بـ __ERROR__.
     """
     try:
         folder_id = ensure_section_folder(slug)
-        up.seek(0)
-        raw = up.getbuffer() if hasattr(up, "getbuffer") else up.read()
-        raw = bytes(raw)
-
-        stamp = datetime.now().strftime("%H%M%S-%Y%m%d")
-        base, ext = os.path.splitext(up.name or "file")
-        safe = "".join(
-            ch if (ch.isalnum() or ch in ("_", "-", ".", " ")) else "_" for ch in base
-        )
-        safe = "_".join(safe.split())
-        fname = f"{stamp}_{safe}{ext.lower()}"
+        sha, md5 = content_digests(up, UPLOAD_CHUNK_MB * 1024 * 1024)
+        existing = find_existing_upload(slug, sha, md5, known)
+        if existing:
+            if progress:
+                progress(1.0)
+            return "__EXISTS__:" + existing
+
+        fname = upload_name(up.name)
 
         media = MediaIoBaseUpload(
-            io.BytesIO(raw),
+            up,
             mimetype=up.type or "application/octet-stream",
-            resumable=False,
+            chunksize=UPLOAD_CHUNK_MB * 1024 * 1024,
+            resumable=True,
         )
 
-        file_meta = {"name": fname, "parents": [folder_id]}
-        created = (
-            drive_service.files()
-            .create(body=file_meta, media_body=media, fields="id")
-            .execute()
-        )
+        file_meta = {"name": fname, "parents": [folder_id], "appProperties": {"sha256": sha}}
+        request = drive_service.files().create(body=file_meta, media_body=media, fields=FILE_FIELDS)
+        created = None
+        with get_drive_metrics().track("save_upload", slug) as rec, drive_http() as http:
+            rec["bytes"] = media.size() or 0
+            while created is None:
+                # الجدولة تعيد الدفعة الحالية فقط بتراجع أسي عند 5xx/429 وانقطاع الشبكة؛
+                # الجلسة القابلة للاستئناف تستعلم عن آخر بايت وصل قبل الإرسال مجددًا
+                status, created = drive_call(lambda: request.next_chunk(http=http))
+                if status and progress:
+                    progress(status.progress())
+        if progress:
+            progress(1.0)
+        note_upload(slug, created)
+        if known is not None:  # ملف مكرر لاحق في الدفعة نفسها
+            known[md5] = known[sha] = created["id"]
         return created["id"]
 
     except Exception as e:
         return "__ERROR__:" + str(e)
 
 
-def delete_file(file_id: str) -> None:
-    drive_service.files().delete(fileId=file_id).execute()
+def upload_many(
+    slug: str, uploads: list, on_tick: Optional[Callable[[List[float]], None]] = None
+) -> List[str]:
+    """
+    يرفع عدة ملفات بالتوازي عبر مجمّع خيوط محدود (UPLOAD_WORKERS).
+    يستدعي on_tick(نسب التقدم) دوريًا من الخيط الرئيسي لتحديث الواجهة،
+    ويعيد نتيجة put (file_id أو __EXISTS__ أو __ERROR__) لكل ملف بنفس الترتيب.
+    بصمات القسم (content_index) تُقرأ مرة واحدة للدفعة كلها لا لكل ملف.
+    """
+    storage = get_storage()
+    storage.folder(slug)
+    known = storage.content_index(slug)
+    done = [0.0] * len(uploads)
+
+    def work(idx: int, up) -> str:
+        # الرفع المجمّع يأتي بعد طلبات الواجهة في طابور الحصة
+        get_drive_scheduler().set_thread_priority(BULK)
+
+        def progress(p: float, idx=idx) -> None:
+            done[idx] = p
+
+        return storage.put(slug, up, progress=progress, known=known)
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as pool:
+        futures = [pool.submit(work, i, up) for i, up in enumerate(uploads)]
+        pending = set(futures)
+        while pending:
+            _, pending = wait(pending, timeout=0.25)
+            if on_tick:
+                on_tick(done)
+    return [f.result() for f in futures]
+
+
+def note_upload(slug: str, f: dict) -> None:
+    """كتابة مباشرة لملف مرفوع في القوائم المشتركة والفهرس، بدل انتظار انتهاء صلاحيتها."""
+    get_listing_cache().invalidate(slug)
+    if SYNC_LISTINGS:
+        listing_index().note_created(f)
+    else:
+        get_search_index().upsert(slug, [_file_row(f)])
+
+
+def delete_file(file_id: str, slug: str = "") -> None:
+    drive_execute(drive_service.files().delete(fileId=file_id), "delete_file", slug)
+    get_listing_cache().invalidate(slug)
+    if SYNC_LISTINGS:
+        listing_index().note_deleted(file_id)
+    get_search_index().remove(file_id)
+
+
+class DriveBackend(StorageBackend):
+    """تنفيذ StorageBackend فوق Google Drive (مجمّع الاتصالات، الجدولة، ذاكرة التنزيل)."""
+
+    def folder(self, slug: str) -> str:
+        return ensure_section_folder(slug)
+
+    def list_page(self, slug, page_token, page_size):
+        return remote_files_page(slug, page_token, page_size)
+
+    def get(self, slug: str, name: str, file_id: str, version: str, dst: BinaryIO) -> None:
+        _download_to(file_id, dst, slug)
+
+    def content_index(self, slug: str) -> Optional[Dict[str, str]]:
+        # فهرس المزامنة يبحث محليًا دون طلبات
+        return None if SYNC_LISTINGS else section_digests(slug)
+
+    def put(
+        self,
+        slug: str,
+        up,
+        progress: Optional[Callable[[float], None]] = None,
+        known: Optional[Dict[str, str]] = None,
+    ) -> str:
+        return save_upload(slug, up, progress, known)
+
+    def delete(self, slug: str, file_id: str, name: str) -> None:
+        delete_file(file_id, slug)
+
+
+@st.cache_resource
+def get_storage() -> StorageBackend:
+    """مخزن الأقسام حسب STORAGE_BACKEND، مشترك بين الجلسات."""
+    if STORAGE_BACKEND == "local":
+        return LocalBackend(LOCAL_STORAGE_DIR, get_search_index(), UPLOAD_CHUNK_MB * 1024 * 1024)
+    return DriveBackend()
+
+
+# ================= Local mirror (qms/<slug>) =================
+
+
+def mirror_dir(slug: str) -> str:
+    return os.path.join(MIRROR_DIR, slug)
+
+
+def _mirror_name(name: str) -> str:
+    """اسم آمن للملف على القرص (أسماء Drive قد تحوي فواصل مسارات)."""
+    return name.replace("/", "_").replace("\\", "_").lstrip(".") or "file"
+
+
+def _load_manifest(slug: str) -> Dict[str, dict]:
+    """{file_id: {name, ver, size}} للملفات التي نسختها المزامنة إلى المرآة."""
+    try:
+        with open(os.path.join(mirror_dir(slug), MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _save_manifest(slug: str, manifest: Dict[str, dict]) -> None:
+    fd, tmp = tempfile.mkstemp(dir=mirror_dir(slug), suffix=".part")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(mirror_dir(slug), MANIFEST_NAME))
+
+
+def mirror_rows(slug: str) -> List[Tuple[str, int, str, str]]:
+    """
+    ملفات القسم من المرآة المحلية، مرتبة تنازلياً بالاسم.
+    الملفات التي لم تأتِ من Drive (غير موجودة في manifest) تظهر بلا file_id.
+    """
+    by_name = {m["name"]: (fid, m.get("ver", "")) for fid, m in _load_manifest(slug).items()}
+    out: List[Tuple[str, int, str, str]] = []
+    try:
+        entries = list(os.scandir(mirror_dir(slug)))
+    except FileNotFoundError:
+        return out
+    for entry in entries:
+        if entry.name.startswith(".") or entry.name.endswith(".part") or not entry.is_file():
+            continue
+        fid, ver = by_name.get(entry.name, ("", ""))
+        out.append((entry.name, entry.stat().st_size, fid, ver))
+    out.sort(key=lambda x: x[0], reverse=True)
+    return out
+
+
+def read_mirror_file(slug: str, name: str) -> bytes:
+    with open(os.path.join(mirror_dir(slug), _mirror_name(name)), "rb") as f:
+        return f.read()
+
+
+def remove_mirror_file(slug: str, name: str) -> None:
+    """حذف فوري من المرآة بعد الحذف من Drive؛ المزامنة التالية تنظّف manifest."""
+    try:
+        os.remove(os.path.join(mirror_dir(slug), _mirror_name(name)))
+    except FileNotFoundError:
+        pass
+
+
+class MirrorSync(threading.Thread):
+    """
+    خيط خلفي يبقي qms/<slug> مطابقًا لمجلدات الأقسام على Drive:
+    ينزّل الجديد والمعدّل (حسب الإصدار في manifest) ويحذف ما أزيل من Drive.
+    الكتابة ذرّية، فتبقى القراءة من القرص ممكنة أثناء المزامنة أو عند تعذر Drive.
+    """
+
+    def __init__(self, slugs: List[str], interval: float):
+        super().__init__(name="qms-mirror-sync", daemon=True)
+        self.slugs = slugs
+        self.interval = interval
+        self.last_sync: Optional[datetime] = None
+        self.last_error = ""
+        self._wake = threading.Event()
+
+    def wake(self) -> None:
+        """طلب مزامنة فورية (بعد رفع أو حذف)."""
+        self._wake.set()
+
+    def run(self) -> None:
+        get_drive_scheduler().set_thread_priority(BULK)
+        while True:
+            try:
+                for slug in self.slugs:
+                    self.sync_section(slug)
+                self.last_sync = datetime.now()
+                self.last_error = ""
+            except Exception as e:  # Drive غير متاح: تبقى المرآة كما هي
+                self.last_error = str(e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def sync_section(self, slug: str) -> None:
+        folder = mirror_dir(slug)
+        os.makedirs(folder, exist_ok=True)
+        manifest = _load_manifest(slug)
+        remote = {fid: (nm, sz, ver) for nm, sz, fid, ver in list_remote_files(slug)}
+
+        for fid, (nm, sz, ver) in remote.items():
+            name = _mirror_name(nm)
+            path = os.path.join(folder, name)
+            known = manifest.get(fid)
+            if known and known.get("ver") == ver and known.get("name") == name and os.path.exists(path):
+                continue
+            fd, tmp = tempfile.mkstemp(dir=folder, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as fh:
+                    _download_to(fid, fh, slug)
+                os.replace(tmp, path)
+            except BaseException:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+                raise
+            if known and known.get("name") != name:
+                self._remove(folder, known.get("name"))
+            manifest[fid] = {"name": name, "ver": ver, "size": sz}
+            _save_manifest(slug, manifest)
+
+        for fid in [fid for fid in manifest if fid not in remote]:
+            self._remove(folder, manifest.pop(fid).get("name"))
+        _save_manifest(slug, manifest)
+        get_search_index().replace_section(
+            slug, [(nm, sz, fid, ver) for fid, (nm, sz, ver) in remote.items()]
+        )
+
+    @staticmethod
+    def _remove(folder: str, name: Optional[str]) -> None:
+        if not name:
+            return
+        try:
+            os.remove(os.path.join(folder, name))
+        except FileNotFoundError:
+            pass
+
+
+@st.cache_resource
+def get_mirror_sync() -> MirrorSync:
+    """خيط مزامنة واحد لكل عملية."""
+    sync = MirrorSync(list(SECTIONS_AR2EN.values()), MIRROR_SYNC_SECONDS)
+    sync.start()
+    return sync
+
+
+class ContentIndexer(threading.Thread):
+    """
+    خيط خلفي يفهرس نصوص ملفات PDF مرة واحدة لكل بصمة محتوى (md5Checksum).
+    يأخذ الملفات المعلّقة من فهرس البحث، ويحضر كل ملف إلى القرص (من المرآة
+    أو ذاكرة التنزيل)، ثم يستخرج النص في عملية Python مستقلة لكل ملف
+    (extract_in_subprocess) حتى لا يُثقل Streamlit.
+    الملف الذي لا يمكن إحضاره أو استخراج نصه (محذوف، بلا صلاحية، أكبر من
+    max_bytes، تالف، أو فشل attempts مرات) يُسجَّل دون نص حتى لا يحجب بقية الملفات المعلّقة.
+    """
+
+    def __init__(self, search: SearchIndex, workers: int, interval: float, max_bytes: int, attempts: int):
+        super().__init__(name="qms-content-indexer", daemon=True)
+        self.search = search
+        self.interval = interval
+        self.batch = workers * 4
+        self.max_bytes = max_bytes
+        self.attempts = attempts
+        self._failures: Dict[str, int] = {}
+        # كل خيط ينتظر عملية استخراج واحدة؛ لا مجمّع عمليات multiprocessing لأن
+        # عماله يعيدون تنفيذ __main__ (سكربت Streamlit نفسه) عند الإقلاع
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="qms-extract")
+        self.last_error = ""
+        self._wake = threading.Event()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def run(self) -> None:
+        get_drive_scheduler().set_thread_priority(BULK)
+        while True:
+            try:
+                self.last_error = ""
+                self.index_pending()
+            except Exception as e:  # Drive غير متاح: يُعاد المحاولة في الدورة التالية
+                self.last_error = str(e)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def index_pending(self) -> None:
+        while True:
+            pending = self.search.pending_texts(self.batch)
+            if not pending:
+                break
+            jobs = {}
+            stored = 0
+            for ver, fid, slug, name, size in pending:
+                try:
+                    path = self._local_path(fid, ver, slug, name, size)
+                except Exception as e:
+                    if self._retry(ver, name, e, is_retryable(e)):
+                        continue
+                    path = None  # خطأ دائم (404/403) أو تكررت الأعطال المؤقتة
+                if path is None:
+                    self._failures.pop(ver, None)
+                    self.search.store_text(ver, "")
+                    stored += 1
+                    continue
+                jobs[self.pool.submit(extract_in_subprocess, path, INDEX_EXTRACT_TIMEOUT)] = (ver, name)
+            for fut in as_completed(jobs):
+                ver, name = jobs[fut]
+                try:
+                    terms = fut.result()
+                except FileNotFoundError:  # أُزيل من الذاكرة قبل قراءته؛ يُعاد لاحقًا
+                    continue
+                except ExtractCrashed as e:  # عملية الاستخراج ماتت أو تجاوزت المهلة
+                    if self._retry(ver, name, e, True):
+                        continue
+                    terms = ""
+                except Exception:  # ملف تالف: يُسجَّل فارغًا حتى لا يُعاد مع كل دورة
+                    terms = ""
+                self._failures.pop(ver, None)
+                self.search.store_text(ver, terms)
+                stored += 1
+            if not stored:
+                break
+        self.search.prune_texts()
+
+    def _retry(self, ver: str, name: str, error: Exception, retryable: bool) -> bool:
+        """يسجّل الخطأ؛ True إن بقيت محاولات للملف فيُترك معلّقًا للدورة التالية."""
+        self.last_error = f"{name}: {error}"
+        fails = self._failures.get(ver, 0) + 1
+        if retryable and fails < self.attempts:
+            self._failures[ver] = fails
+            return True
+        return False
+
+    def _local_path(self, file_id: str, version: str, slug: str, name: str, size: int) -> Optional[str]:
+        """مسار الملف على القرص، أو None إن كان أكبر من أن يُنزَّل للفهرسة."""
+        path = get_storage().local_path(slug, name, file_id, version)
+        if path is not None:
+            return path
+        if MIRROR_MODE:
+            path = os.path.join(mirror_dir(slug), _mirror_name(name))
+            if os.path.exists(path):
+                return path
+        cache = get_download_cache()
+        key = f"{file_id}:{version}"
+        path = cache.get_path(key)
+        if path is not None:
+            return path
+        if size > min(self.max_bytes, cache.max_bytes):
+            return None
+        return cache.put_stream(key, lambda fh: _download_to(file_id, fh, slug))
+
+
+@st.cache_resource
+def get_content_indexer() -> ContentIndexer:
+    """مفهرس نصوص واحد لكل عملية."""
+    indexer = ContentIndexer(
+        get_search_index(), INDEX_WORKERS, INDEX_POLL_SECONDS, INDEX_MAX_MB * 1024 * 1024, INDEX_ATTEMPTS
+    )
+    indexer.start()
+    return indexer
+
+
+class ThumbnailWorker(threading.Thread):
+    """
+    خيط خلفي يجهّز صور المعاينة المصغرة (الصفحة الأولى لملفات PDF، والصور
+    مصغّرة) من الصور التي يولّدها Drive نفسه، فلا يُنزَّل الملف كاملاً.
+    المفتاح file_id + الإصدار، فتعديل الملف يولّد معاينة جديدة؛ والملفات التي
+    لا معاينة لها، أو التي يعيد Drive لها ما ليس صورة (صفحة HTML مثلاً)،
+    تُخزَّن فارغة حتى لا يُعاد طلبها.
+    """
+
+    def __init__(self, cache: DiskCache, size_px: int):
+        super().__init__(name="qms-thumbnails", daemon=True)
+        self.cache = cache
+        # ضعف حجم العرض للشاشات عالية الكثافة
+        self.size_px = size_px * 2
+        self.last_error = ""
+        self._queue: "queue.Queue[Tuple[str, str, str]]" = queue.Queue()
+        self._queued: set = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_id: str, version: str) -> str:
+        return f"thumb:{file_id}:{version}"
+
+    def path(self, file_id: str, version: str) -> Optional[str]:
+        """مسار المعاينة الجاهزة أو None (غير جاهزة بعد أو لا معاينة للملف)."""
+        path = self.cache.get_path(self.key(file_id, version))
+        try:
+            return path if path and os.path.getsize(path) > 0 else None
+        except FileNotFoundError:
+            return None
+
+    def request(self, file_id: str, version: str, slug: str) -> None:
+        """يطلب تجهيز معاينة ملف ظهر في القائمة (يتجاهل المطلوب والجاهز مسبقًا)."""
+        key = self.key(file_id, version)
+        with self._lock:
+            if key in self._queued or self.cache.get_path(key):
+                return
+            self._queued.add(key)
+        self._queue.put((file_id, version, slug))
+
+    def run(self) -> None:
+        get_drive_scheduler().set_thread_priority(BULK)
+        while True:
+            file_id, version, slug = self._queue.get()
+            try:
+                data = self._fetch(file_id, slug)
+                if not self._is_image(data):
+                    data = b""
+                self.cache.put_stream(self.key(file_id, version), lambda fh: fh.write(data))
+                self.last_error = ""
+            except Exception as e:  # يُعاد الطلب عند ظهور الملف في القائمة مرة أخرى
+                self.last_error = str(e)
+            finally:
+                with self._lock:
+                    self._queued.discard(self.key(file_id, version))
+
+    def discard(self, file_id: str, version: str) -> None:
+        """يستبدل معاينة تعذّر عرضها بعلامة فارغة حتى لا يُعاد عرضها أو طلبها."""
+        self.cache.put_stream(self.key(file_id, version), lambda fh: None)
+
+    @staticmethod
+    def _is_image(data: bytes) -> bool:
+        if not data or not HAS_PIL:
+            return bool(data)
+        from PIL import Image  # HAS_PIL
+
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                img.verify()
+            return True
+        except Exception:
+            return False
+
+    def _fetch(self, file_id: str, slug: str) -> bytes:
+        meta = drive_execute(
+            drive_service.files().get(fileId=file_id, fields="thumbnailLink"), "thumbnail", slug
+        )
+        link = meta.get("thumbnailLink")
+        if not link:
+            return b""
+        # الرابط ينتهي بـ =s<px>؛ يطلب من Drive تصغيرها إلى الحجم المطلوب مباشرة
+        link = re.sub(r"=s\d+$", f"=s{self.size_px}", link)
+
+        def attempt() -> bytes:
+            with get_drive_metrics().track("thumbnail_fetch", slug) as rec, drive_http() as http:
+                resp, body = http.request(link)
+                if resp.status != 200:
+                    raise HttpError(resp, body, uri=link)
+                rec["bytes"] = len(body)
+                # صفحة تسجيل دخول أو تحويل بدل الصورة: لا معاينة
+                if not resp.get("content-type", "").startswith("image/"):
+                    return b""
+                return body
+
+        return drive_call(attempt)
+
+
+@st.cache_resource
+def get_thumbnail_worker() -> ThumbnailWorker:
+    """عامل معاينات واحد لكل عملية، بذاكرة قرص مستقلة عن ذاكرة التنزيل."""
+    worker = ThumbnailWorker(DiskCache(THUMB_CACHE_DIR, THUMB_CACHE_MB * 1024 * 1024), THUMB_PX)
+    worker.start()
+    return worker
+
+
+def copy_file_to(slug: str, name: str, file_id: str, version: str, dst: BinaryIO) -> None:
+    """
+    ينسخ محتوى ملف من القائمة إلى dst دفعةً دفعة: من المرآة أو ذاكرة التنزيل
+    إن وُجد فيهما، وإلا يتدفق مباشرة من Drive دون تخزينه كاملاً في الذاكرة.
+    """
+    path = get_storage().local_path(slug, name, file_id, version)
+    if path is None and MIRROR_MODE:
+        path = os.path.join(mirror_dir(slug), _mirror_name(name))
+    elif path is None and version:
+        path = get_download_cache().get_path(f"{file_id}:{version}")
+    if path and os.path.exists(path):
+        with open(path, "rb") as src:
+            shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_MB * 1024 * 1024)
+    else:
+        get_storage().get(slug, name, file_id, version, dst)
+
+
+def _prune_exports() -> None:
+    cutoff = time.time() - EXPORT_TTL_SECONDS
+    for entry in os.scandir(EXPORT_DIR):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def export_section_zip(slug: str, progress: Optional[Callable[[str], None]] = None) -> str:
+    """
+    يكتب جميع ملفات القسم في أرشيف ZIP على القرص ملفًا بعد ملف، فلا تتجاوز
+    الذاكرة دفعة واحدة مهما كبر القسم. يعيد مسار الأرشيف داخل EXPORT_DIR.
+    الملفات تُخزَّن دون ضغط (ZIP_STORED): PDF وملفات Office مضغوطة أصلاً.
+    """
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _prune_exports()
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    final = os.path.join(EXPORT_DIR, f"{slug}-{stamp}-{secrets.token_hex(8)}.zip")
+    fd, tmp = tempfile.mkstemp(dir=EXPORT_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as raw, zipfile.ZipFile(raw, "w", zipfile.ZIP_STORED) as zf:
+            used: Dict[str, int] = {}
+            for nm, sz, fid, ver in list_files(slug):
+                arc = _mirror_name(nm)
+                if arc in used:
+                    used[arc] += 1
+                    base, ext = os.path.splitext(arc)
+                    arc = f"{base} ({used[arc]}){ext}"
+                else:
+                    used[arc] = 0
+                if progress:
+                    progress(arc)
+                with zf.open(arc, "w", force_zip64=True) as dst:
+                    copy_file_to(slug, nm, fid, ver, dst)
+        os.replace(tmp, final)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return final
+
+
+def read_file(slug: str, name: str, file_id: str, version: str) -> bytes:
+    """محتوى ملف من القائمة: من المخزن المحلي أو المرآة إن وُجدا، وإلا من Drive."""
+    path = get_storage().local_path(slug, name, file_id, version)
+    if path is not None:
+        with open(path, "rb") as f:
+            return f.read()
+    if MIRROR_MODE:
+        return read_mirror_file(slug, name)
+    return download_file_content(file_id, version, slug)
+
+
+# عدّ طلبات Drive في إعادة التشغيل الحالية (تعرضه لوحة المراقبة)
+drive_metrics = get_drive_metrics()
+drive_metrics.start_run()
+
+content_indexer = get_content_indexer() if (CONTENT_INDEX and HAS_PYPDF) else None
+thumbnails = get_thumbnail_worker() if THUMBNAILS else None
+
+storage = get_storage()
+
+if MIRROR_MODE:
+    # القراءة من القرص؛ Drive يُستخدم فقط من خيط المزامنة وللرفع والحذف
+    mirror_sync = get_mirror_sync()
+elif STORAGE_BACKEND == "drive":
+    # حل مجلدات الأقسام عند بدء العملية (مرة واحدة لكل الجلسات)
+    section_folder_map()
 
 
 # ================= Sidebar: اختيار القسم + كلمة المرور =========
@@ -328,62 +1593,228 @@ if st.sidebar.button("دخول", key=f"enter_{slug}"):
         st.session_state[auth_key(slug)] = False
         st.sidebar.error("كلمة المرور غير صحيحة.")
 
+st.sidebar.markdown("### البحث في جميع الأقسام")
+search_q = st.sidebar.text_input("اسم الملف أو جزء منه", key="search_q")
+search_body = content_indexer is not None and st.sidebar.checkbox(
+    "البحث داخل محتوى ملفات PDF أيضًا", key="search_body"
+)
+if not (SYNC_LISTINGS or MIRROR_MODE):
+    # دون فهرس Changes أو مرآة لا يعرف الفهرس إلا ما ظهر في قوائم الأقسام المفتوحة
+    st.sidebar.caption("يشمل البحث ملفات الأقسام التي فُتحت قوائمها فقط، فقد لا تظهر ملفات بقية الأقسام.")
+
+# ================= Search (من الفهرس المحلي دون Drive) =========
+
+if search_q.strip():
+    SLUG2AR = {v: k for k, v in SECTIONS_AR2EN.items()}
+    hits = get_search_index().search(search_q)
+    if search_body:
+        seen = {h[3] for h in hits}
+        hits += [h for h in get_search_index().search_content(search_q) if h[3] not in seen]
+    st.markdown(f"### نتائج البحث عن «{search_q.strip()}» 🔎")
+    if not hits:
+        st.info("لا توجد ملفات مطابقة.")
+    for j, (h_slug, h_name, h_size, h_fid, h_ver) in enumerate(hits, start=1):
+        c1, c2 = st.columns([6, 2])
+        with c1:
+            st.markdown(
+                f"**{h_name}**  <span class='muted'>({SLUG2AR.get(h_slug, h_slug)} · {human_size(h_size)})</span>",
+                unsafe_allow_html=True,
+            )
+        with c2:
+            if st.session_state.get("dl_ready_search") != h_fid:
+                if st.button("تجهيز للتنزيل", key=f"sprep_{j}"):
+                    st.session_state["dl_ready_search"] = h_fid
+                    rerun()
+            else:
+                try:
+                    st.download_button(
+                        "تنزيل",
+                        data=read_file(h_slug, h_name, h_fid, h_ver),
+                        file_name=h_name,
+                        key=f"sdl_{j}",
+                    )
+                except Exception as e:
+                    st.caption(f"تعذّر تنزيل الملف: {e}")
+    st.divider()
+
 # ================= Files (قراءة للجميع) =========
 
 st.markdown("### الملفات الحالية (متاحة للقراءة والتحميل للجميع) 📂")
 
-files = list_files(slug)
-if not files:
+# كل صفحة تُقرأ من الفهرس المحلي أو بطلب files().list واحد؛ الصفحة التالية تُجلب عند الانتقال إليها
+if page_key(slug) not in st.session_state:
+    st.session_state[page_key(slug)] = {"tokens": [None], "page": 0}
+paging = st.session_state[page_key(slug)]
+page_no = paging["page"]
+
+files, next_token = list_files_page(slug, paging["tokens"][page_no])
+if next_token and len(paging["tokens"]) == page_no + 1:
+    paging["tokens"].append(next_token)
+
+if not files and page_no == 0:
     st.info("لا توجد ملفات بعد في هذا القسم.")
 else:
-    for i, (nm, sz, fid) in enumerate(files, start=1):
-        c1, c2, c3 = st.columns([5, 2, 1])
+    for i, (nm, sz, fid, ver) in enumerate(files, start=page_no * PAGE_SIZE + 1):
+        c0, c1, c2, c3 = st.columns([1, 5, 2, 1])
+        with c0:
+            # المعاينة تُعرض عند جاهزيتها؛ وإلا تُطلب من العامل وتظهر في إعادة تشغيل لاحقة
+            if thumbnails is not None and fid:
+                thumb = thumbnails.path(fid, ver)
+                if thumb:
+                    try:
+                        st.image(thumb, width=THUMB_PX)
+                    except Exception:  # ملف معاينة تالف: يُعرض الصف دونها
+                        thumbnails.discard(fid, ver)
+                else:
+                    thumbnails.request(fid, ver, slug)
         with c1:
             st.markdown(
                 f"**#{i} — {nm}**  <span class='muted'>({human_size(sz)})</span>",
                 unsafe_allow_html=True,
             )
         with c2:
-            try:
-                content = download_file_content(fid)
-                st.download_button(
-                    "تنزيل",
-                    data=content,
-                    file_name=nm,
-                    key=f"dl_{slug}_{i}",
-                )
-            except Exception as e:
-                st.caption(f"تعذّر تنزيل الملف: {e}")
+            # التنزيل عند الطلب: لا يُجلب محتوى الملف من Drive إلا بعد ضغط "تجهيز"
+            row_id = fid or nm
+            if DOWNLOAD_MODE == "lazy" and st.session_state.get(dl_key(slug)) != row_id:
+                if st.button("تجهيز للتنزيل", key=f"prep_{slug}_{i}"):
+                    st.session_state[dl_key(slug)] = row_id
+                    rerun()
+            else:
+                try:
+                    content = read_file(slug, nm, fid, ver)
+                    st.download_button(
+                        "تنزيل",
+                        data=content,
+                        file_name=nm,
+                        key=f"dl_{slug}_{i}",
+                    )
+                except Exception as e:
+                    st.caption(f"تعذّر تنزيل الملف: {e}")
         with c3:
             # زر حذف يظهر فقط لو المستخدم أدخل كلمة المرور
-            if st.session_state.get(auth_key(slug), False):
+            if fid and st.session_state.get(auth_key(slug), False):
                 if st.button("حذف", key=f"rm_{slug}_{i}"):
                     try:
-                        delete_file(fid)
+                        storage.delete(slug, fid, nm)
+                        if MIRROR_MODE:
+                            remove_mirror_file(slug, nm)
+                            mirror_sync.wake()
+                        st.session_state.pop(page_key(slug), None)
                         st.success("تم حذف الملف.")
-                        st.experimental_rerun()
+                        rerun()
                     except Exception as e:
                         st.error(f"تعذّر الحذف: {e}")
 
+    p1, p2, p3 = st.columns([1, 2, 1])
+    with p1:
+        if page_no > 0 and st.button("→ السابق", key=f"prev_{slug}"):
+            paging["page"] -= 1
+            rerun()
+    with p2:
+        st.markdown(
+            f"<div class='muted' style='text-align:center'>الصفحة {page_no + 1}</div>",
+            unsafe_allow_html=True,
+        )
+    with p3:
+        if next_token and st.button("التالي ←", key=f"next_{slug}"):
+            paging["page"] += 1
+            rerun()
+
+    # تصدير القسم كاملاً: الأرشيف يُبنى على القرص ويُرسل تدفقًا من مسار التنزيل دون تحميله في الذاكرة
+    export_key = f"export_{slug}"
+    if not routes_enabled():
+        st.caption("تنزيل القسم كاملاً متاح عند تشغيل التطبيق بـ: streamlit run serve.py")
+    elif st.button("📦 تنزيل القسم كاملاً (ZIP)", key=f"zip_{slug}"):
+        status = st.empty()
+        try:
+            path = export_section_zip(slug, lambda name: status.caption(f"جارٍ إضافة: {name}"))
+            st.session_state[export_key] = path
+            status.empty()
+        except Exception as e:
+            status.error(f"تعذّر إنشاء الأرشيف: {e}")
+    export_path = st.session_state.get(export_key)
+    if export_path and os.path.exists(export_path):
+        url = f"{EXPORT_URL}/{os.path.basename(export_path)}"
+        st.markdown(
+            f"<a href='{url}' download='{slug}.zip'>⬇️ تنزيل {slug}.zip "
+            f"({human_size(os.path.getsize(export_path))})</a>",
+            unsafe_allow_html=True,
+        )
+
 # ================= Control Panel (رفع فقط) =============
 
 st.markdown("### لوحة التحكم (رفع الملفات للقسم المحدد) 🔒")
 
 if st.session_state.get(auth_key(slug), False):
-    st.markdown("#### رفع ملف جديد إلى هذا القسم (Google Drive)")
-    up = st.file_uploader(
-        "اختر ملفًا (PDF, DOCX, XLSX, PNG, JPG, ...)", type=None, key=f"uploader_{slug}"
+    store_label = "Google Drive" if STORAGE_BACKEND == "drive" else "التخزين المحلي"
+    st.markdown(f"#### رفع ملفات جديدة إلى هذا القسم ({store_label})")
+    # تغيير المفتاح بعد كل دفعة رفع يفرّغ أداة الاختيار
+    round_no = st.session_state.get(f"upload_round_{slug}", 0)
+    ups = st.file_uploader(
+        "اختر ملفًا أو أكثر (PDF, DOCX, XLSX, PNG, JPG, ...)",
+        type=None,
+        accept_multiple_files=True,
+        key=f"uploader_{slug}_{round_no}",
     )
-    if up is not None:
-        res = save_upload(slug, up)
-        if isinstance(res, str) and res.startswith("__ERROR__:"):
-            st.error("تعذّر حفظ الملف: " + res.replace("__ERROR__:", ""))
+    if ups and st.button(f"رفع {len(ups)} ملف", key=f"upload_{slug}"):
+        bars = [st.progress(0.0, text=up.name) for up in ups]
+
+        def on_tick(done: List[float]) -> None:
+            for bar, up, p in zip(bars, ups, done):
+                bar.progress(min(max(p, 0.0), 1.0), text=up.name)
+
+        results = upload_many(slug, ups, on_tick)
+        errors = [
+            (up.name, res.replace("__ERROR__:", ""))
+            for up, res in zip(ups, results)
+            if isinstance(res, str) and res.startswith("__ERROR__:")
+        ]
+        existing = [up.name for up, res in zip(ups, results) if res.startswith("__EXISTS__:")]
+        uploaded = len(ups) - len(errors) - len(existing)
+        if MIRROR_MODE:
+            mirror_sync.wake()
+        if content_indexer is not None:
+            content_indexer.wake()
+        st.session_state.pop(page_key(slug), None)
+        if errors or existing:
+            if not errors:
+                st.session_state[f"upload_round_{slug}"] = round_no + 1
+            st.warning(f"تم رفع {uploaded} من {len(ups)} ملف.")
+            for name in existing:
+                st.info(f"الملف {name} موجود مسبقًا في هذا القسم (نفس المحتوى)، فلم يُرفع مرة أخرى.")
+            for name, err in errors:
+                st.error(f"تعذّر حفظ الملف {name}: {err}")
         else:
-            st.success("✅ تم رفع الملف بنجاح إلى Google Drive.")
-            st.experimental_rerun()
+            st.session_state[f"upload_round_{slug}"] = round_no + 1
+            st.success(f"✅ تم رفع {len(ups)} ملف بنجاح إلى {store_label}.")
+            rerun()
 else:
     st.info("لرفع أو حذف الملفات في هذا القسم، أدخل كلمة المرور الصحيحة من القائمة الجانبية.")
 
+# ================= Admin: مراقبة طلبات Drive =============
+
+with st.sidebar.expander("لوحة المراقبة (للمشرف)"):
+    admin_pw = st.text_input("كلمة مرور المشرف", type="password", key="pw_admin")
+    if st.button("دخول", key="enter_admin"):
+        st.session_state["auth_admin"] = bool(
+            admin_pw and ADMIN_PASSWORD and admin_pw.strip() == str(ADMIN_PASSWORD).strip()
+        )
+        if not st.session_state["auth_admin"]:
+            st.error("كلمة المرور غير صحيحة.")
+
+if st.session_state.get("auth_admin", False):
+    st.markdown("### مراقبة طلبات Google Drive 📊")
+    run = drive_metrics.run_stats()
+    st.caption(
+        f"هذه الصفحة: {run['calls']} طلب إلى Drive، "
+        f"{run['seconds']:.2f} ثانية، {human_size(run['bytes'])}"
+    )
+    st.dataframe(drive_metrics.snapshot(), use_container_width=True)
+    with st.expander("تصدير Prometheus"):
+        if METRICS_EXPORT_SECONDS > 0:
+            st.caption(f"يُكتب للجمع عبر textfile collector في: {os.path.abspath(METRICS_FILE)}")
+        st.code(drive_metrics.prometheus(), language="text")
+
 st.markdown(
     "<div class='sig'>تصميم وتطوير رئيس مهندسين أقدم طارق مجيد الكريمي ©</div>",
     unsafe_allow_html=True,